@@ -21,12 +21,8 @@ class AreaAdmin(admin.ModelAdmin):
     list_filter = ('featured',)
     search_fields = ('name', 'description')
     inlines = [AreaImageInline, AreaPerkInline, AreaGuideInline]
+    # Maintained incrementally from Property changes (see areas.signals)
     readonly_fields = ('properties_count', 'average_price')
-    
-    def save_model(self, request, obj, form, change):
-        """Update area stats after saving."""
-        super().save_model(request, obj, form, change)
-        obj.update_stats()
 
 @admin.register(AreaImage)
 class AreaImageAdmin(admin.ModelAdmin):
@@ -1,6 +1,11 @@
 
 from django.apps import AppConfig
+from django.db.models.signals import pre_migrate
 
 class AreasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'areas'
+    
+    def ready(self):
+        from .signals import create_trigram_extension
+        pre_migrate.connect(create_trigram_extension, sender=self, dispatch_uid='areas_trigram_extension')
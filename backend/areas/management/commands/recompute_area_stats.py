@@ -0,0 +1,10 @@
+
+from django.core.management.base import BaseCommand
+from areas.models import Area
+
+class Command(BaseCommand):
+    help = 'Rebuild properties_count and average_price for every area from one grouped query.'
+    
+    def handle(self, *args, **options):
+        count = Area.objects.all().recompute_stats()
+        self.stdout.write(self.style.SUCCESS(f"Recomputed stats for {count} areas."))
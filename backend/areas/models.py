@@ -1,39 +1,100 @@
 
 from django.db import models
+from django.db.models import Case, Count, DecimalField, F, Sum, When
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from luxe_properties.response_cache import invalidate_response_cache
+from luxe_properties.storage import blob_storage
+
+class AreaQuerySet(models.QuerySet):
+    def apply_stats_delta(self, count_delta, price_delta):
+        """Shift the running property count and price total, recomputing the average in the same UPDATE."""
+        new_count = F('properties_count') + count_delta
+        new_total = F('price_total') + price_delta
+        return self.update(
+            properties_count=new_count,
+            price_total=new_total,
+            average_price=Case(
+                When(properties_count__gt=-count_delta, then=new_total / new_count),
+                default=0,
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ),
+        )
+    
+    def recompute_stats(self, batch_size=1000):
+        """Rebuild count, total and average for these areas from one grouped query over properties."""
+        from properties.models import Property
+        
+        totals = {
+            row['area_id']: row
+            for row in Property.objects.filter(area__in=self).order_by()
+            .values('area_id').annotate(count=Count('id'), total=Sum('price'))
+        }
+        
+        areas = []
+        for area in self.only('id'):
+            row = totals.get(area.id)
+            area.properties_count = row['count'] if row else 0
+            area.price_total = row['total'] if row else 0
+            area.average_price = round(row['total'] / row['count'], 2) if row else 0
+            areas.append(area)
+        
+        self.model.objects.bulk_update(
+            areas, ['properties_count', 'price_total', 'average_price'], batch_size=batch_size
+        )
+        # bulk_update sends no signals, so drop cached area responses here
+        invalidate_response_cache('areas')
+        return len(areas)
 
 class Area(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField()
-    image = models.ImageField(upload_to='area_images/')
+    image = models.ImageField(storage=blob_storage, upload_to='area_images/')
     properties_count = models.PositiveIntegerField(default=0)
     average_price = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Running sum of property prices so average_price can be maintained from deltas
+    price_total = models.DecimalField(max_digits=18, decimal_places=2, default=0, editable=False)
     featured = models.BooleanField(default=False)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = AreaQuerySet.as_manager()
+    
+    search_vector_fields = (('name', 'A'), ('description', 'C'))
+    
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='area_search_idx'),
+            # Fuzzy area name matching; needs the pg_trgm extension (see areas.apps)
+            GinIndex(fields=['name'], name='area_name_trgm_idx', opclasses=['gin_trgm_ops']),
+            models.Index(fields=['latitude', 'longitude'], name='area_lat_lng_idx'),
+        ]
+    
     def __str__(self):
         return self.name
     
     def update_stats(self):
-        """Update properties count and average price based on properties in this area."""
-        from properties.models import Property
-        
-        properties = Property.objects.filter(area=self)
-        self.properties_count = properties.count()
-        
-        if self.properties_count > 0:
-            self.average_price = properties.aggregate(avg_price=models.Avg('price'))['avg_price']
-        else:
-            self.average_price = 0
+        """
+        Recompute properties count and average price from scratch.
         
-        self.save()
+        The stats are normally kept current by the Property signals in
+        areas.signals; this is only needed after bulk changes that skip them.
+        """
+        Area.objects.filter(pk=self.pk).recompute_stats()
+        self.refresh_from_db(fields=['properties_count', 'price_total', 'average_price'])
 
 class AreaImage(models.Model):
     area = models.ForeignKey(Area, on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField(upload_to='area_images/')
+    image = models.ImageField(storage=blob_storage, upload_to='area_images/', db_index=True)
     is_primary = models.BooleanField(default=False)
+    # Filled in by luxe_properties.images after upload
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    blurhash = models.CharField(max_length=64, blank=True, editable=False)
+    variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
@@ -1,11 +1,17 @@
 
 from rest_framework import serializers
+from luxe_properties.images import build_srcset
 from .models import Area, AreaImage, AreaPerk, AreaGuide
 
 class AreaImageSerializer(serializers.ModelSerializer):
+    srcset = serializers.SerializerMethodField()
+    
     class Meta:
         model = AreaImage
-        fields = ['id', 'image', 'is_primary']
+        fields = ['id', 'image', 'is_primary', 'width', 'height', 'blurhash', 'srcset']
+    
+    def get_srcset(self, obj):
+        return build_srcset(self.context['request'], obj.image.storage, obj.variants)
 
 class AreaPerkSerializer(serializers.ModelSerializer):
     class Meta:
@@ -19,25 +25,38 @@ class AreaGuideSerializer(serializers.ModelSerializer):
 
 class AreaListSerializer(serializers.ModelSerializer):
     primary_image = serializers.SerializerMethodField()
+    primary_image_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Area
-        fields = ['id', 'name', 'description', 'primary_image', 'properties_count', 'average_price', 'featured']
+        fields = ['id', 'name', 'description', 'primary_image', 'primary_image_srcset',
+                  'properties_count', 'average_price', 'featured']
+    
+    def get_card_image(self, obj):
+        """The AreaImage shown on the card, or None to fall back to Area.image."""
+        # images are prefetched by AreaViewSet, so pick in Python instead of querying per area
+        images = list(obj.images.all())
+        primary = next((image for image in images if image.is_primary), None)
+        if primary or obj.image:
+            return primary
+        return images[0] if images else None
     
     def get_primary_image(self, obj):
-        primary = obj.images.filter(is_primary=True).first()
-        if primary:
-            return self.context['request'].build_absolute_uri(primary.image.url)
+        image = self.get_card_image(obj)
+        if image:
+            return self.context['request'].build_absolute_uri(image.image.url)
         
-        # If no primary image, return area image or first additional image
+        # If no primary image, return area image
         if obj.image:
             return self.context['request'].build_absolute_uri(obj.image.url)
         
-        first_image = obj.images.first()
-        if first_image:
-            return self.context['request'].build_absolute_uri(first_image.image.url)
-        
         return None
+    
+    def get_primary_image_srcset(self, obj):
+        image = self.get_card_image(obj)
+        if image:
+            return build_srcset(self.context['request'], image.image.storage, image.variants)
+        return {}
 
 class AreaDetailSerializer(serializers.ModelSerializer):
     images = AreaImageSerializer(many=True, read_only=True)
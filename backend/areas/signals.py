@@ -0,0 +1,76 @@
+
+from django.db import connections
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from luxe_properties.images import image_processed, schedule_image_processing
+from luxe_properties.search import update_search_vector
+from luxe_properties.response_cache import invalidate_response_cache
+from properties.models import Property
+from .models import Area, AreaImage, AreaPerk, AreaGuide
+
+def create_trigram_extension(sender, using, **kwargs):
+    """Make sure pg_trgm exists before the trigram index on Area.name is created."""
+    with connections[using].cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+post_save.connect(update_search_vector, sender=Area, dispatch_uid='area_search_vector')
+
+@receiver(post_save, sender=Property)
+def apply_area_stats_on_save(sender, instance, created, update_fields=None, **kwargs):
+    """Move the property's price between area running totals instead of re-aggregating."""
+    if update_fields and not {'area', 'price'}.intersection(update_fields):
+        return
+    
+    if created:
+        if instance.area_id:
+            Area.objects.filter(pk=instance.area_id).apply_stats_delta(1, instance.price)
+        return
+    
+    loaded = getattr(instance, '_loaded_values', None)
+    if loaded is None or 'area_id' not in loaded or 'price' not in loaded:
+        # Saved without being loaded from the database; the old values are unknown
+        if instance.area_id:
+            Area.objects.filter(pk=instance.area_id).recompute_stats()
+        return
+    
+    old_area_id, old_price = loaded['area_id'], loaded['price']
+    if old_area_id == instance.area_id:
+        if old_area_id and old_price != instance.price:
+            Area.objects.filter(pk=old_area_id).apply_stats_delta(0, instance.price - old_price)
+        return
+    
+    if old_area_id:
+        Area.objects.filter(pk=old_area_id).apply_stats_delta(-1, -old_price)
+    if instance.area_id:
+        Area.objects.filter(pk=instance.area_id).apply_stats_delta(1, instance.price)
+
+@receiver(post_delete, sender=Property)
+def apply_area_stats_on_delete(sender, instance, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    area_id = loaded.get('area_id', instance.area_id)
+    if area_id:
+        Area.objects.filter(pk=area_id).apply_stats_delta(-1, -loaded.get('price', instance.price))
+
+@receiver(post_save, sender=AreaImage)
+def process_uploaded_area_image(sender, instance, created, **kwargs):
+    if created:
+        schedule_image_processing(AreaImage, [instance.pk])
+
+@receiver(post_save, sender=Area)
+@receiver(post_delete, sender=Area)
+@receiver(image_processed, sender=AreaImage)
+@receiver(post_save, sender=AreaImage)
+@receiver(post_delete, sender=AreaImage)
+@receiver(post_save, sender=AreaPerk)
+@receiver(post_delete, sender=AreaPerk)
+@receiver(post_save, sender=AreaGuide)
+@receiver(post_delete, sender=AreaGuide)
+def invalidate_area_responses(sender, **kwargs):
+    # Trends show the area name
+    invalidate_response_cache('areas', 'market_trends')
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def invalidate_area_stats_responses(sender, **kwargs):
+    """Area list/detail responses include properties_count and average_price."""
+    invalidate_response_cache('areas')
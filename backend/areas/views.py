@@ -5,34 +5,33 @@ from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import Area, AreaImage
 from .serializers import AreaListSerializer, AreaDetailSerializer, AreaCreateUpdateSerializer
-from users.models import UserRole
+from users.permissions import IsAdminOrReadOnly
+from luxe_properties.geo import GeoFilter
+from luxe_properties.search_filter import FullTextSearchFilter
+from luxe_properties.response_cache import CachedResponseMixin, cache_response, invalidate_response_cache
+from luxe_properties.uploads import ChunkedImageUploadMixin
 
-class IsAdminOrReadOnly(permissions.BasePermission):
-    """
-    Custom permission to only allow admins to edit, but allow anyone to read.
-    """
-    
-    def has_permission(self, request, view):
-        # Read permissions are allowed to any request
-        if request.method in permissions.SAFE_METHODS:
-            return True
-        
-        # Write permissions are only allowed to admins
-        if not request.user.is_authenticated:
-            return False
-        
-        return UserRole.objects.filter(
-            user=request.user,
-            role__in=[UserRole.RoleChoices.ADMIN, UserRole.RoleChoices.SUPERADMIN]
-        ).exists()
-
-class AreaViewSet(viewsets.ModelViewSet):
+class AreaViewSet(CachedResponseMixin, ChunkedImageUploadMixin, viewsets.ModelViewSet):
     queryset = Area.objects.all()
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, FullTextSearchFilter, GeoFilter]
     filterset_fields = ['featured']
-    search_fields = ['name', 'description']
+    # name and description are matched through Area.search_vector, plus fuzzy name matching
+    search_trigram_fields = ['name']
     ordering_fields = ['name', 'properties_count', 'average_price']
     permission_classes = [IsAdminOrReadOnly]
+    cache_namespace = 'areas'
+    upload_image_model = AreaImage
+    upload_parent_field = 'area'
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            # AreaListSerializer picks the card image from the prefetched images
+            return queryset.prefetch_related('images')
+        return queryset
+    
+    def images_uploaded(self, area, images):
+        invalidate_response_cache('areas')
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -48,7 +47,8 @@ class AreaViewSet(viewsets.ModelViewSet):
         return Response({'status': 'area stats updated'})
     
     @action(detail=False, methods=['get'])
+    @cache_response
     def featured(self, request):
-        featured_areas = Area.objects.filter(featured=True)
+        featured_areas = Area.objects.filter(featured=True).prefetch_related('images')
         serializer = AreaListSerializer(featured_areas, many=True, context={'request': request})
         return Response(serializer.data)
@@ -0,0 +1,134 @@
+
+"""
+Location filters shared by the property and area APIs.
+
+Models store plain `latitude`/`longitude` DecimalFields with a composite B-tree
+index on (latitude, longitude), so no PostGIS is needed. `GeoFilter` adds
+`?bbox=` and `?near=lat,lng&radius_km=`; radius searches are narrowed by the
+index on the radius' bounding box first and then checked exactly with the
+haversine distance, which is also used for ordering. `grid_clusters` groups
+rows into map cells for a zoom level.
+"""
+import math
+from django.db.models import Avg, Count, FloatField, Min, Value
+from django.db.models.functions import ASin, Cast, Cos, Floor, Power, Radians, Sin, Sqrt
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 111.32
+MAX_RADIUS_KM = 500
+MAX_ZOOM = 20
+# Cells per map tile edge; 4 gives clusters roughly 64px apart on 256px tiles
+CELLS_PER_TILE = 4
+
+def parse_floats(value, count, name):
+    try:
+        numbers = [float(part) for part in value.split(',')]
+    except (AttributeError, ValueError):
+        numbers = []
+    if len(numbers) != count or not all(math.isfinite(number) for number in numbers):
+        raise ValidationError({name: f'Expected {count} comma-separated numbers.'})
+    return numbers
+
+def bounding_box(latitude, longitude, radius_km):
+    """Return (min_lat, min_lng, max_lat, max_lng) enclosing a circle around a point."""
+    lat_delta = radius_km / KM_PER_DEGREE_LAT
+    cos_lat = math.cos(math.radians(latitude))
+    lng_delta = 180.0 if cos_lat < 1e-6 else min(radius_km / (KM_PER_DEGREE_LAT * cos_lat), 180.0)
+    return (
+        max(latitude - lat_delta, -90.0), max(longitude - lng_delta, -180.0),
+        min(latitude + lat_delta, 90.0), min(longitude + lng_delta, 180.0),
+    )
+
+def distance_km(latitude, longitude):
+    """Haversine distance in km from a point to each row's latitude/longitude."""
+    lat = Radians(Cast('latitude', FloatField()))
+    lng = Radians(Cast('longitude', FloatField()))
+    origin_lat = math.radians(latitude)
+    origin_lng = math.radians(longitude)
+    a = (
+        Power(Sin((lat - Value(origin_lat)) / 2), 2)
+        + Value(math.cos(origin_lat)) * Cos(lat) * Power(Sin((lng - Value(origin_lng)) / 2), 2)
+    )
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(a), output_field=FloatField())
+
+def filter_bbox(queryset, min_lat, min_lng, max_lat, max_lng):
+    return queryset.filter(
+        latitude__gte=min_lat, latitude__lte=max_lat,
+        longitude__gte=min_lng, longitude__lte=max_lng,
+    )
+
+class GeoFilter(filters.BaseFilterBackend):
+    """
+    Filter by location.
+
+    - ?bbox=min_lng,min_lat,max_lng,max_lat keeps rows inside the box
+    - ?near=lat,lng&radius_km=R keeps rows within R km, annotates `distance_km`
+      and orders by it unless an explicit ?ordering= is given
+    """
+
+    bbox_param = 'bbox'
+    near_param = 'near'
+    radius_param = 'radius_km'
+    default_radius_km = 10
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        if params.get(self.bbox_param):
+            min_lng, min_lat, max_lng, max_lat = parse_floats(params[self.bbox_param], 4, self.bbox_param)
+            if min_lat > max_lat or min_lng > max_lng:
+                raise ValidationError({self.bbox_param: 'Expected min_lng,min_lat,max_lng,max_lat.'})
+            queryset = filter_bbox(queryset, min_lat, min_lng, max_lat, max_lng)
+
+        if params.get(self.near_param):
+            latitude, longitude = parse_floats(params[self.near_param], 2, self.near_param)
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                raise ValidationError({self.near_param: 'Expected lat,lng.'})
+            radius = parse_floats(params.get(self.radius_param, str(self.default_radius_km)), 1, self.radius_param)[0]
+            if not 0 < radius <= MAX_RADIUS_KM:
+                raise ValidationError({self.radius_param: f'Must be between 0 and {MAX_RADIUS_KM}.'})
+
+            # The box condition is what the (latitude, longitude) index serves
+            queryset = filter_bbox(queryset, *bounding_box(latitude, longitude, radius))
+            queryset = queryset.annotate(distance_km=distance_km(latitude, longitude)).filter(distance_km__lte=radius)
+
+            if not params.get(api_settings.ORDERING_PARAM):
+                queryset = queryset.order_by('distance_km', 'id')
+
+        return queryset
+
+def grid_clusters(queryset, zoom):
+    """
+    Group rows with coordinates into grid cells sized for a map zoom level.
+
+    Returns one dict per non-empty cell with the cell's row count, the mean
+    position of its rows, and the row id when the cell holds a single row.
+    """
+    cell = 360.0 / (2 ** zoom * CELLS_PER_TILE)
+    rows = (
+        queryset.exclude(latitude=None).exclude(longitude=None)
+        .annotate(
+            cell_lat=Floor(Cast('latitude', FloatField()) / cell),
+            cell_lng=Floor(Cast('longitude', FloatField()) / cell),
+        )
+        .order_by()
+        .values('cell_lat', 'cell_lng')
+        .annotate(
+            count=Count('id'),
+            center_lat=Avg(Cast('latitude', FloatField())),
+            center_lng=Avg(Cast('longitude', FloatField())),
+            first_id=Min('id'),
+        )
+    )
+    return [
+        {
+            'latitude': round(row['center_lat'], 6),
+            'longitude': round(row['center_lng'], 6),
+            'count': row['count'],
+            'id': row['first_id'] if row['count'] == 1 else None,
+        }
+        for row in rows
+    ]
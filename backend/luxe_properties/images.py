@@ -0,0 +1,209 @@
+
+"""
+Responsive image variants for uploaded photos.
+
+Models that take part (PropertyImage, AreaImage) have an `image` field plus
+`width`, `height`, `blurhash` and `variants` columns. After an upload commits,
+`schedule_image_processing` hands the rows to a thread pool that writes
+thumbnail/medium/large copies in WebP and JPEG next to the original, stores
+the variant names, the original dimensions and a blurhash placeholder, and then
+sends `image_processed` so denormalized copies can be refreshed. Pillow
+releases the GIL while decoding, resizing and encoding, so threads are enough.
+
+With IMAGE_PROCESSING_WORKERS = 0 images are processed inline on commit.
+"""
+import io
+import logging
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.dispatch import Signal
+
+logger = logging.getLogger(__name__)
+
+# Longest edge in pixels per variant
+VARIANT_SIZES = {
+    'thumbnail': 320,
+    'medium': 768,
+    'large': 1600,
+}
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Sent with the model class and the primary key once an image's variants are stored
+image_processed = Signal()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_PROCESSING_WORKERS, thread_name_prefix='image-processing'
+            )
+    return _executor
+
+def schedule_image_processing(model, pks):
+    """Generate variants for the given rows once the current transaction commits."""
+    pks = list(pks)
+    if not pks:
+        return
+
+    def submit():
+        for pk in pks:
+            if settings.IMAGE_PROCESSING_WORKERS:
+                get_executor().submit(run_in_worker, model, pk)
+            else:
+                process_image(model, pk)
+    transaction.on_commit(submit)
+
+def run_in_worker(model, pk, force=False):
+    try:
+        process_image(model, pk, force=force)
+    except Exception:
+        logger.exception('Processing %s %s failed', model._meta.label, pk)
+    finally:
+        # Worker threads open their own connection; don't leave it idle in the pool thread
+        connection.close()
+
+def process_image(model, pk, force=False):
+    """Write the variants of one image row and record them on the row."""
+    instance = model._default_manager.filter(pk=pk).first()
+    if instance is None or not instance.image:
+        return
+
+    if not force:
+        # With content-addressed storage a re-uploaded photo shares its blob with earlier rows,
+        # and its variants would come out byte-identical, so copy them instead of re-encoding
+        processed = (
+            model._default_manager.filter(image=instance.image.name).exclude(pk=pk).exclude(variants={})
+            .values('width', 'height', 'blurhash', 'variants').first()
+        )
+        if processed:
+            model._default_manager.filter(pk=pk).update(**processed)
+            image_processed.send(sender=model, pk=pk)
+            return
+
+    # Pillow is only needed once a photo is processed, not when signals load at startup
+    from PIL import Image, ImageOps
+
+    storage = instance.image.storage
+    with storage.open(instance.image.name, 'rb') as f:
+        image = Image.open(f)
+        width, height = image.size
+        # EXIF orientations 5-8 rotate by 90 degrees, so the displayed size is swapped
+        if image.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+            width, height = height, width
+        # Let the JPEG decoder scale down while decoding; no variant needs more than the largest size
+        largest = max(VARIANT_SIZES.values())
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        image.load()
+
+    variants = build_variants(storage, instance.image.name, image)
+    model._default_manager.filter(pk=pk).update(
+        width=width, height=height, blurhash=encode_blurhash(image), variants=variants
+    )
+    image_processed.send(sender=model, pk=pk)
+
+def build_variants(storage, name, image):
+    """Save every size/format combination and return {size: {'width', 'height', format: name}}."""
+    from PIL import Image
+
+    directory, filename = os.path.split(os.path.splitext(name)[0])
+    variants = {}
+    for size, edge in VARIANT_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((edge, edge), Image.LANCZOS)
+        entry = {'width': resized.width, 'height': resized.height}
+        for extension, (format, options) in VARIANT_FORMATS.items():
+            output = resized if format != 'JPEG' or resized.mode == 'RGB' else resized.convert('RGB')
+            buffer = io.BytesIO()
+            output.save(buffer, format, **options)
+            entry[extension] = storage.save(
+                os.path.join(directory, 'variants', f'{filename}_{size}.{extension}'),
+                ContentFile(buffer.getvalue()),
+            )
+        variants[size] = entry
+    return variants
+
+def build_srcset(request, storage, variants):
+    """Absolute variant URLs for a serializer: {size: {'width', 'height', 'webp', 'jpeg'}}."""
+    srcset = {}
+    for size, entry in (variants or {}).items():
+        srcset[size] = {
+            key: request.build_absolute_uri(storage.url(value)) if key in VARIANT_FORMATS else value
+            for key, value in entry.items()
+        }
+    return srcset
+
+BLURHASH_CHARACTERS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+
+def encode_base83(value, length):
+    return ''.join(
+        BLURHASH_CHARACTERS[(value // 83 ** (length - index)) % 83] for index in range(1, length + 1)
+    )
+
+def srgb_to_linear(value):
+    value = value / 255
+    return value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+
+def linear_to_srgb(value):
+    value = min(max(value, 0), 1)
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+def encode_blurhash(image, x_components=4, y_components=3):
+    """Encode a blurhash (https://blurha.sh) from a 32px copy of the image."""
+    small = image.convert('RGB')
+    small.thumbnail((32, 32))
+    width, height = small.size
+    pixels = [tuple(srgb_to_linear(channel) for channel in pixel) for pixel in small.getdata()]
+
+    factors = []
+    for j in range(y_components):
+        cos_y = [math.cos(math.pi * j * y / height) for y in range(height)]
+        for i in range(x_components):
+            cos_x = [math.cos(math.pi * i * x / width) for x in range(width)]
+            normalisation = 1 if i == 0 and j == 0 else 2
+            r = g = b = 0.0
+            for y in range(height):
+                for x in range(width):
+                    basis = cos_x[x] * cos_y[y]
+                    pr, pg, pb = pixels[y * width + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = normalisation / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    blurhash = encode_base83((x_components - 1) + (y_components - 1) * 9, 1)
+
+    maximum = max((abs(value) for factor in ac for value in factor), default=0)
+    quantised_maximum = max(0, min(82, int(maximum * 166 - 0.5)))
+    maximum = (quantised_maximum + 1) / 166
+    blurhash += encode_base83(quantised_maximum, 1)
+
+    blurhash += encode_base83(
+        (linear_to_srgb(dc[0]) << 16) + (linear_to_srgb(dc[1]) << 8) + linear_to_srgb(dc[2]), 4
+    )
+
+    def quantise(value):
+        signed = math.copysign(abs(value / maximum) ** 0.5, value)
+        return max(0, min(18, int(math.floor(signed * 9 + 9.5))))
+
+    for r, g, b in ac:
+        blurhash += encode_base83(quantise(r) * 19 * 19 + quantise(g) * 19 + quantise(b), 2)
+    return blurhash
@@ -0,0 +1,130 @@
+
+"""
+Response cache for public, rarely changing read endpoints.
+
+Responses are cached per namespace (e.g. 'areas') in the 'responses' cache
+alias, keyed on the URL with its query parameters sorted and the negotiated
+format. Each namespace has a version that model signals bump through
+`invalidate_response_cache`, which drops every cached response of that
+namespace at once. Each cached response is stored with an ETag hashed from its
+data, and a request whose If-None-Match holds that ETag gets a 304 without
+touching the view. Last-Modified (the namespace's last invalidation) is only
+sent when the cache is shared between workers; with a per-process cache the
+other workers never hear of an invalidation.
+"""
+import hashlib
+import json
+import time
+from functools import partial, wraps
+from urllib.parse import urlencode
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils.http import http_date, parse_http_date_safe
+
+CACHE_ALIAS = 'responses'
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+def is_shared_cache(cache):
+    return not isinstance(cache, (LocMemCache, DummyCache))
+
+def namespace_key(namespace):
+    return f'response-namespace:{namespace}'
+
+def get_namespace_state(namespace):
+    """Return (version, last_modified) for a namespace, starting a new version if none is cached."""
+    cache = get_cache()
+    state = cache.get(namespace_key(namespace))
+    if state is None:
+        now = int(time.time())
+        state = (time.time_ns(), now)
+        # add() so concurrent workers agree on the first version
+        if not cache.add(namespace_key(namespace), state, None):
+            state = cache.get(namespace_key(namespace), state)
+    return state
+
+def invalidate_response_cache(*namespaces):
+    """Drop every cached response in the given namespaces once the current transaction commits."""
+    def bump():
+        for namespace in namespaces:
+            get_cache().set(namespace_key(namespace), (time.time_ns(), int(time.time())), None)
+    transaction.on_commit(bump)
+
+def request_signature(request):
+    """The request URL with its query parameters sorted, so equivalent filter combinations share an entry."""
+    query = urlencode(sorted((key, sorted(values)) for key, values in request.query_params.lists()), doseq=True)
+    fmt = getattr(request.accepted_renderer, 'format', '')
+    return f'{request.build_absolute_uri(request.path)}?{query}|{fmt}'
+
+def cache_response(view_method=None, namespace=None):
+    """
+    Cache a viewset action's response under the view's `cache_namespace`.
+
+    Use as @cache_response, or @cache_response(namespace='...') for an action
+    whose data is invalidated separately from the rest of the view.
+    """
+    if view_method is None:
+        return partial(cache_response, namespace=namespace)
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        # Models import this module for invalidate_response_cache at startup, so DRF is imported on use
+        from rest_framework import status
+        from rest_framework.response import Response
+        from rest_framework.utils.encoders import JSONEncoder
+
+        if request.method not in ('GET', 'HEAD'):
+            return view_method(self, request, *args, **kwargs)
+
+        cache_namespace = namespace or self.cache_namespace
+        version, last_modified = get_namespace_state(cache_namespace)
+        digest = hashlib.sha1(request_signature(request).encode()).hexdigest()
+        key = f'response:{cache_namespace}:{version}:{digest}'
+        cache = get_cache()
+
+        entry = cache.get(key)
+        if entry is None:
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            # The ETag changes exactly when the data does, whichever worker rendered it
+            body = json.dumps(response.data, cls=JSONEncoder, sort_keys=True).encode()
+            entry = (response.data, f'"{hashlib.sha1(body).hexdigest()}"')
+            cache.set(key, entry)
+        data, etag = entry
+
+        headers = {'ETag': etag, 'Cache-Control': 'public, no-cache'}
+        if not is_shared_cache(cache):
+            last_modified = None
+        else:
+            headers['Last-Modified'] = http_date(last_modified)
+
+        if not_modified(request, etag, last_modified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(data, headers=headers)
+    return wrapper
+
+def not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    if last_modified is None:
+        return False
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and last_modified <= if_modified_since
+
+class CachedResponseMixin:
+    """Serve list and retrieve from the response cache; set `cache_namespace` on the view."""
+
+    cache_namespace = None
+
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
@@ -0,0 +1,28 @@
+
+"""
+Full-text search shared by the property, area and market insight APIs.
+
+Models that take part declare `search_vector_fields` as (field, weight) pairs
+and carry a `search_vector` SearchVectorField with a GIN index. The stored
+vector is rebuilt by `update_search_vector` on save; the API side is
+`luxe_properties.search_filter.FullTextSearchFilter`. This module is imported
+by models and signals at startup, so it does not import DRF.
+"""
+from django.contrib.postgres.search import SearchVector
+
+SEARCH_CONFIG = 'english'
+
+def build_search_vector(model):
+    """Return the weighted SearchVector expression for a model's searchable columns."""
+    vector = None
+    for field, weight in model.search_vector_fields:
+        part = SearchVector(field, weight=weight, config=SEARCH_CONFIG)
+        vector = part if vector is None else vector + part
+    return vector
+
+def update_search_vector(sender, instance, update_fields=None, **kwargs):
+    """post_save receiver that rebuilds the stored search vector of one row in SQL."""
+    searchable = {field for field, weight in sender.search_vector_fields}
+    if update_fields and not searchable.intersection(update_fields):
+        return
+    sender._default_manager.filter(pk=instance.pk).update(search_vector=build_search_vector(sender))
@@ -0,0 +1,54 @@
+"""
+Full-text search filter for the property, area and market insight APIs.
+
+`FullTextSearchFilter` replaces DRF's SearchFilter while keeping the
+`?search=` parameter, and matches against the `search_vector` columns
+maintained by `luxe_properties.search`.
+"""
+import re
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db.models import F, Q
+from rest_framework import filters
+from rest_framework.settings import api_settings
+from .search import SEARCH_CONFIG
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter backed by the stored `search_vector` column.
+
+    Terms are matched as stemmed prefixes, results are ranked with SearchRank
+    (plus trigram similarity on `search_trigram_fields`) unless the client
+    asked for an explicit `?ordering=`. `search_related_fields` such as
+    'area__name' are matched through an IN subquery on the small related table.
+    """
+
+    def get_search_query(self, request):
+        words = re.findall(r'\w+', ' '.join(self.get_search_terms(request)))
+        if not words:
+            return None, ''
+        raw_query = ' & '.join(f'{word}:*' for word in words)
+        return SearchQuery(raw_query, search_type='raw', config=SEARCH_CONFIG), ' '.join(words)
+
+    def filter_queryset(self, request, queryset, view):
+        query, text = self.get_search_query(request)
+        if query is None:
+            return queryset
+
+        condition = Q(search_vector=query)
+        rank = SearchRank(F('search_vector'), query)
+
+        for field in getattr(view, 'search_trigram_fields', []):
+            condition |= Q(**{f'{field}__trigram_similar': text})
+            rank = rank + TrigramSimilarity(field, text)
+
+        for lookup in getattr(view, 'search_related_fields', []):
+            relation, field = lookup.rsplit('__', 1)
+            related_model = queryset.model._meta.get_field(relation).related_model
+            matches = related_model._default_manager.filter(**{f'{field}__icontains': text})
+            condition |= Q(**{f'{relation}__in': matches.values('pk')})
+
+        queryset = queryset.annotate(search_rank=rank).filter(condition)
+
+        if not request.query_params.get(api_settings.ORDERING_PARAM):
+            queryset = queryset.order_by('-search_rank', *queryset.query.order_by)
+        return queryset
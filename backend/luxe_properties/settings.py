@@ -30,11 +30,13 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Third-party apps
     'rest_framework',
     'corsheaders',
     'rest_framework_simplejwt',
+    'django_filters',
     
     # Local apps
     'users',
@@ -43,6 +45,17 @@ INSTALLED_APPS = [
     'market_insights',
 ]
 
+# Lazy loading for API workers and CLI commands (measure with `manage.py profile_startup --compare`).
+# Each app's URLconf, views and serializers are imported on the first request routed to it instead
+# of all at once, and apps the API does not use at runtime are left out: rest_framework_simplejwt
+# is only installed for its translations and imports pkg_resources, and staticfiles only provides
+# collectstatic and runserver's static handler.
+LAZY_LOADING = os.getenv('LAZY_LOADING', 'False') == 'True'
+
+if LAZY_LOADING:
+    INSTALLED_APPS.remove('rest_framework_simplejwt')
+    INSTALLED_APPS.remove('django.contrib.staticfiles')
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -126,6 +139,28 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Threads generating thumbnail/medium/large variants of uploaded photos (luxe_properties.images).
+# 0 processes each upload inline once its transaction commits.
+IMAGE_PROCESSING_WORKERS = int(os.getenv('IMAGE_PROCESSING_WORKERS', '2'))
+
+# Chunked image uploads (luxe_properties.uploads); the temp dir must be shared by all API workers
+IMAGE_UPLOAD_TEMP_DIR = os.getenv('IMAGE_UPLOAD_TEMP_DIR', os.path.join(BASE_DIR, 'tmp', 'uploads'))
+IMAGE_UPLOAD_MAX_FILE_SIZE = int(os.getenv('IMAGE_UPLOAD_MAX_FILE_SIZE', str(50 * 1024 * 1024)))
+IMAGE_UPLOAD_MAX_FILES = 100
+# Uncommitted uploads older than this many seconds are deleted
+IMAGE_UPLOAD_EXPIRY = 24 * 60 * 60
+
+# Outgoing mail; inquiry notifications are sent by the send_inquiry_notifications command.
+# Unset values keep Django's defaults (SMTP on localhost:25); see README for local development.
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', '25'))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'False') == 'True'
+EMAIL_TIMEOUT = 10
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'Luxe Properties <noreply@localhost>')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -134,7 +169,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.RoleClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -143,6 +178,32 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10,
 }
 
+# Caches
+# Public read endpoints are cached in the 'responses' alias (see luxe_properties.response_cache).
+# Set RESPONSE_CACHE_URL to a redis:// URL to share it between workers (requires the redis package).
+RESPONSE_CACHE_URL = os.getenv('RESPONSE_CACHE_URL', '')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': (
+            'django.core.cache.backends.redis.RedisCache' if RESPONSE_CACHE_URL
+            else 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': RESPONSE_CACHE_URL or 'responses',
+        'TIMEOUT': int(os.getenv('RESPONSE_CACHE_TIMEOUT', '300')),
+    },
+}
+
+# Seconds to keep a user's roles in the cache across requests (0 keeps them per request only)
+ROLE_CACHE_TIMEOUT = int(os.getenv('ROLE_CACHE_TIMEOUT', '0'))
+
+# Seconds a user's role version is cached when validating JWT role claims.
+# Use a shared cache (e.g. Redis) in production so role changes reach every worker.
+ROLE_VERSION_CACHE_TIMEOUT = int(os.getenv('ROLE_VERSION_CACHE_TIMEOUT', '60'))
+
 # Simple JWT settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
@@ -0,0 +1,102 @@
+
+"""
+Content-addressed storage for listing and area photos.
+
+Every file saved through `ContentAddressedStorage` is stored under the SHA-256
+of its bytes (`blobs/ab/ab12...ef.jpg`), whatever name it was uploaded with,
+so a photo re-uploaded to several listings is written to disk once and all
+image rows point at the same blob. A blob's content can never change under its
+name, which lets `serve_blob` send far-future immutable cache headers; a CDN or
+browser that has fetched it once for one listing reuses it for every other.
+
+Deleting an image row leaves its blob in place because other rows may share it.
+The `gc_media_blobs` command removes blobs no row references any more; saving a
+photo whose blob exists refreshes the blob's mtime, so the command's grace
+period also covers a row that is about to reference an old blob.
+"""
+import hashlib
+import os
+import tempfile
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.http import HttpResponseNotModified
+from django.utils.deconstruct import deconstructible
+from django.views.static import serve
+
+BLOB_DIR = 'blobs'
+BLOB_NAME = r'[0-9a-f]{2}/[0-9a-f]{64}(\.[a-z0-9]+)?'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Uploaded names differ in case and spelling; the blob keeps one extension per format
+EXTENSION_ALIASES = {'.jpeg': '.jpg'}
+
+def content_digest(content):
+    sha256 = hashlib.sha256()
+    for chunk in content.chunks():
+        sha256.update(chunk)
+    content.seek(0)
+    return sha256.hexdigest()
+
+def blob_name(digest, extension):
+    extension = extension.lower()
+    return f'{BLOB_DIR}/{digest[:2]}/{digest}{EXTENSION_ALIASES.get(extension, extension)}'
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names each file after its content hash and stores identical files once."""
+
+    def save(self, name, content, max_length=None):
+        if content is None:
+            raise ValueError('Cannot save an empty file.')
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        name = blob_name(content_digest(content), os.path.splitext(name or content.name or '')[1])
+        if self.exists(name):
+            # Touch the blob so gc_media_blobs keeps it within its grace period while the new row is saved
+            try:
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                # Collected between the check and the touch; write it again
+                pass
+        return self._save(name, content)
+
+    def _save(self, name, content):
+        # Write to a temporary file and rename it into place, so readers never see a partial blob and
+        # two requests storing the same photo at once simply both install identical bytes
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(directory, self.directory_permissions_mode)
+
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # A taken name already holds the same bytes, so there is nothing to avoid
+        return name
+
+blob_storage = ContentAddressedStorage()
+
+def serve_blob(request, path):
+    """Serve a blob from MEDIA_ROOT with immutable caching; the digest in the name doubles as the ETag."""
+    etag = '"%s"' % os.path.splitext(os.path.basename(path))[0]
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = serve(request, path, document_root=blob_storage.path(BLOB_DIR))
+    response['ETag'] = etag
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
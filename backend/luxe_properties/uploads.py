@@ -0,0 +1,239 @@
+
+"""
+Chunked, resumable image uploads for property and area galleries.
+
+A client opens an upload, sends each file in one or more PUT requests with a
+Content-Range header (the raw request body is appended to a file on disk as it
+arrives, never buffered in memory), and finally commits. The total size given
+with a file's first chunk is recorded, and commit refuses files that have not
+received all of it. Commit then checks every file by reading only its image header, moves the files into media storage and
+creates all image rows with one bulk_create. An interrupted file can be
+resumed from the offset returned by GET on the same URL.
+
+    POST /<pk>/uploads/                               -> {"upload_id": ...}
+    PUT  /<pk>/uploads/<upload_id>/files/<filename>/  (Content-Range: bytes 0-999/5000)
+    GET  /<pk>/uploads/<upload_id>/files/<filename>/  -> {"offset": ...}
+    POST /<pk>/uploads/<upload_id>/commit/            {"primary": "<filename>"}
+
+Upload state lives in IMAGE_UPLOAD_TEMP_DIR, which must be shared by all
+workers that serve the API.
+"""
+import fcntl
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils.text import get_valid_filename
+from PIL import Image, UnidentifiedImageError
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from .images import schedule_image_processing
+
+STREAM_CHUNK_SIZE = 64 * 1024
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'WEBP'}
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+UPLOAD_ID = r'(?P<upload_id>[0-9a-f]{32})'
+
+def upload_dir(upload_id):
+    return os.path.join(settings.IMAGE_UPLOAD_TEMP_DIR, upload_id)
+
+def manifest_path(upload_id):
+    return os.path.join(upload_dir(upload_id), 'manifest.json')
+
+def update_manifest(upload_id, update):
+    """Apply `update` to the manifest under an exclusive lock, as files of one upload may be sent in parallel."""
+    with open(manifest_path(upload_id), 'r+') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        manifest = json.load(f)
+        update(manifest)
+        f.seek(0)
+        f.truncate()
+        json.dump(manifest, f)
+    return manifest
+
+def remove_expired_uploads():
+    """Delete uploads that were never committed."""
+    root = settings.IMAGE_UPLOAD_TEMP_DIR
+    if not os.path.isdir(root):
+        return
+    cutoff = time.time() - settings.IMAGE_UPLOAD_EXPIRY
+    for entry in os.scandir(root):
+        if entry.is_dir() and entry.stat().st_mtime < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+def check_image_header(path):
+    """Return (width, height) after checking the file is an allowed image, reading only its header."""
+    try:
+        with Image.open(path) as image:
+            if image.format not in ALLOWED_FORMATS:
+                raise ValidationError(f'{image.format} images are not supported.')
+            return image.size
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        raise ValidationError('Not a valid image.')
+
+class ChunkedImageUploadMixin:
+    """
+    Viewset actions for chunked image uploads to a detail object.
+
+    Set `upload_image_model` (e.g. PropertyImage) and `upload_parent_field`
+    (e.g. 'property'), and override `check_upload_permission` and
+    `images_uploaded` as needed.
+    """
+
+    upload_image_model = None
+    upload_parent_field = None
+
+    def check_upload_permission(self, request, obj):
+        pass
+
+    def images_uploaded(self, obj, images):
+        """Called inside the commit transaction with the created image rows."""
+
+    def get_upload(self, request, obj, upload_id):
+        try:
+            with open(manifest_path(upload_id)) as f:
+                fcntl.flock(f, fcntl.LOCK_SH)
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            raise NotFound('Unknown or expired upload.')
+        if manifest['user'] != request.user.pk or manifest['parent'] != [obj._meta.label, obj.pk]:
+            raise NotFound('Unknown or expired upload.')
+        return manifest
+
+    @action(detail=True, methods=['post'], url_path='uploads')
+    def start_upload(self, request, pk=None):
+        obj = self.get_object()
+        self.check_upload_permission(request, obj)
+        remove_expired_uploads()
+
+        upload_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(upload_dir(upload_id), 'files'))
+        with open(manifest_path(upload_id), 'w') as f:
+            # files maps each filename to the total size announced with its first chunk
+            json.dump({'user': request.user.pk, 'parent': [obj._meta.label, obj.pk], 'files': {}}, f)
+
+        return Response({
+            'upload_id': upload_id,
+            'max_file_size': settings.IMAGE_UPLOAD_MAX_FILE_SIZE,
+            'max_files': settings.IMAGE_UPLOAD_MAX_FILES,
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get', 'put'], url_path=rf'uploads/{UPLOAD_ID}/files/(?P<filename>[^/]+)')
+    def upload_file(self, request, upload_id, filename, pk=None):
+        obj = self.get_object()
+        self.check_upload_permission(request, obj)
+        self.get_upload(request, obj, upload_id)
+
+        files_dir = os.path.join(upload_dir(upload_id), 'files')
+        filename = get_valid_filename(os.path.basename(filename))
+        path = os.path.join(files_dir, filename)
+        offset = os.path.getsize(path) if os.path.exists(path) else 0
+
+        if request.method == 'GET':
+            return Response({'filename': filename, 'offset': offset})
+
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        content_range = request.META.get('HTTP_CONTENT_RANGE')
+        if content_range:
+            match = CONTENT_RANGE.match(content_range)
+            if not match:
+                raise ValidationError({'Content-Range': 'Expected "bytes <start>-<end>/<total>".'})
+            start, end, total = (int(group) for group in match.groups())
+            if end < start or end >= total or end - start + 1 != length:
+                raise ValidationError({'Content-Range': 'Range does not match the request body.'})
+        else:
+            start, total = 0, length
+
+        if total > settings.IMAGE_UPLOAD_MAX_FILE_SIZE:
+            raise ValidationError({'detail': f'Files are limited to {settings.IMAGE_UPLOAD_MAX_FILE_SIZE} bytes.'})
+        if offset == 0 and not os.path.exists(path) and len(os.listdir(files_dir)) >= settings.IMAGE_UPLOAD_MAX_FILES:
+            raise ValidationError({'detail': f'An upload holds at most {settings.IMAGE_UPLOAD_MAX_FILES} files.'})
+        if start != offset:
+            # The client resumes from the offset we actually have
+            return Response({'filename': filename, 'offset': offset}, status=status.HTTP_409_CONFLICT)
+        
+        def record_total(manifest):
+            files = manifest.setdefault('files', {})
+            if offset == 0 or filename not in files:
+                files[filename] = total
+        if update_manifest(upload_id, record_total)['files'][filename] != total:
+            raise ValidationError({'Content-Range': 'Total size differs from the one sent with the first chunk.'})
+
+        # Copy the raw body to disk as it arrives; request.data is never touched, so nothing is buffered
+        with open(path, 'ab') as f:
+            remaining = length
+            while remaining > 0:
+                chunk = request.stream.read(min(STREAM_CHUNK_SIZE, remaining)) if request.stream else b''
+                if not chunk:
+                    break
+                f.write(chunk)
+                remaining -= len(chunk)
+        offset = os.path.getsize(path)
+
+        return Response({'filename': filename, 'offset': offset, 'complete': offset == total})
+
+    @action(detail=True, methods=['post'], url_path=rf'uploads/{UPLOAD_ID}/commit')
+    def commit_upload(self, request, upload_id, pk=None):
+        obj = self.get_object()
+        self.check_upload_permission(request, obj)
+        manifest = self.get_upload(request, obj, upload_id)
+
+        files_dir = os.path.join(upload_dir(upload_id), 'files')
+        filenames = sorted(os.listdir(files_dir))
+        if not filenames:
+            raise ValidationError({'detail': 'No files were uploaded.'})
+        primary = request.data.get('primary')
+        if primary and primary not in filenames:
+            raise ValidationError({'primary': f'{primary} is not part of this upload.'})
+
+        errors = {}
+        sizes = {}
+        for filename in filenames:
+            received = os.path.getsize(os.path.join(files_dir, filename))
+            expected = manifest.get('files', {}).get(filename)
+            if received != expected:
+                errors[filename] = f'Incomplete file: received {received} of {expected} bytes.'
+                continue
+            try:
+                sizes[filename] = check_image_header(os.path.join(files_dir, filename))
+            except ValidationError as exc:
+                errors[filename] = exc.detail
+        if errors:
+            raise ValidationError(errors)
+
+        model = self.upload_image_model
+        field = model._meta.get_field('image')
+        with transaction.atomic():
+            if primary:
+                # Only one image per parent is primary
+                model.objects.filter(**{self.upload_parent_field: obj, 'is_primary': True}).update(is_primary=False)
+            images = []
+            for filename in filenames:
+                with open(os.path.join(files_dir, filename), 'rb') as f:
+                    name = field.storage.save(field.generate_filename(None, filename), File(f))
+                images.append(model(
+                    **{self.upload_parent_field: obj},
+                    image=name,
+                    is_primary=(filename == primary),
+                    width=sizes[filename][0],
+                    height=sizes[filename][1],
+                ))
+            images = model.objects.bulk_create(images)
+            # bulk_create sends no post_save, so hand the rows to the variant pipeline here
+            schedule_image_processing(model, [image.pk for image in images])
+            self.images_uploaded(obj, images)
+
+        shutil.rmtree(upload_dir(upload_id), ignore_errors=True)
+        return Response({
+            'images': [
+                {'id': image.pk, 'image': request.build_absolute_uri(image.image.url), 'is_primary': image.is_primary}
+                for image in images
+            ],
+        }, status=status.HTTP_201_CREATED)
@@ -1,15 +1,25 @@
 
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
+from .storage import BLOB_DIR, BLOB_NAME, serve_blob
+
+def app_urls(module):
+    """include() an app's URLconf; with LAZY_LOADING it and its views are imported on the first request routed to it."""
+    if settings.LAZY_LOADING:
+        # path() takes include()'s (urlconf, app_name, namespace) triple, and URLResolver imports a dotted path on first use
+        return (module, None, None)
+    return include(module)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/users/', include('users.urls')),
-    path('api/properties/', include('properties.urls')),
-    path('api/areas/', include('areas.urls')),
-    path('api/market-insights/', include('market_insights.urls')),
+    path('api/users/', app_urls('users.urls')),
+    path('api/properties/', app_urls('properties.urls')),
+    path('api/areas/', app_urls('areas.urls')),
+    path('api/market-insights/', app_urls('market_insights.urls')),
+    # Content-addressed photos are served with immutable cache headers in every environment
+    re_path(rf"^{settings.MEDIA_URL.lstrip('/')}{BLOB_DIR}/(?P<path>{BLOB_NAME})$", serve_blob),
 ]
 
 # Serve media files in development
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class MarketInsightsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'market_insights'
+    
+    def ready(self):
+        from . import signals  # noqa: F401
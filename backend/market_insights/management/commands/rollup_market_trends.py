@@ -0,0 +1,17 @@
+
+from django.core.management.base import BaseCommand
+from market_insights.models import MarketTrend, PendingTrendRollup
+from properties.models import Property
+
+class Command(BaseCommand):
+    help = 'Recompute MarketTrend rows for the periods whose listings changed since the last run.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Queue every price history month first, rebuilding all computed trends.')
+    
+    def handle(self, *args, **options):
+        if options['full']:
+            PendingTrendRollup.objects.mark_properties(Property.objects.all())
+        count = MarketTrend.objects.rollup()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} market trends."))
@@ -1,9 +1,42 @@
 
-from django.db import models
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+from django.db import models, transaction
+from django.db.models import Avg, Count, DateField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Trunc, TruncMonth
+from django.utils import timezone
 from django.utils.text import slugify
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from luxe_properties.response_cache import invalidate_response_cache
+from properties.models import PropertyPriceHistory, PropertyStatus
 from users.models import User
 
+# Months per trend period, and the date_trunc unit that groups listings into it
+PERIOD_MONTHS = {'monthly': 1, 'quarterly': 3, 'yearly': 12}
+PERIOD_TRUNC_KINDS = {'monthly': 'month', 'quarterly': 'quarter', 'yearly': 'year'}
+# Average price moves within this many percent of the previous period are reported as stable
+STABLE_THRESHOLD = Decimal('1.00')
+MAX_PRICE_CHANGE = Decimal('999.99')
+
+def period_start(day, period):
+    months = PERIOD_MONTHS[period]
+    return day.replace(month=(day.month - 1) // months * months + 1, day=1)
+
+def shift_period(start, period, count=1):
+    months = start.year * 12 + start.month - 1 + PERIOD_MONTHS[period] * count
+    return date(months // 12, months % 12 + 1, 1)
+
+def period_moment(day):
+    """Local midnight starting `day`, for comparing timestamps against period bounds."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+def local_month(moment):
+    return timezone.localtime(moment).date().replace(day=1)
+
 class MarketReport(models.Model):
     title = models.CharField(max_length=255)
     slug = models.SlugField(unique=True, max_length=255)
@@ -13,9 +46,17 @@ class MarketReport(models.Model):
     cover_image = models.ImageField(upload_to='report_covers/')
     published_date = models.DateField()
     is_featured = models.BooleanField(default=False)
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    search_vector_fields = (('title', 'A'), ('summary', 'B'), ('content', 'C'))
+    
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='report_search_idx'),
+        ]
+    
     def save(self, *args, **kwargs):
         # Generate slug if not provided
         if not self.slug:
@@ -25,6 +66,128 @@ class MarketReport(models.Model):
     def __str__(self):
         return self.title
 
+class MarketTrendQuerySet(models.QuerySet):
+    def rollup(self):
+        """
+        Recompute the trends of every period with queued listing changes.
+        
+        Each pending (area, property type, month) touches one monthly, one
+        quarterly and one yearly period, plus the period after each of them,
+        whose price_change is measured against it. Touched periods are
+        aggregated from PropertyPriceHistory with one grouped query per period
+        length and written with one upsert; touched periods that no longer have
+        price history lose their trend row. Returns the number of trend rows written.
+        """
+        pending = list(PendingTrendRollup.objects.values_list('id', 'area_id', 'property_type', 'month', 'marked_at'))
+        if not pending:
+            return 0
+        
+        written = 0
+        with transaction.atomic():
+            for period in PERIOD_MONTHS:
+                touched = {
+                    (area_id, property_type, period_start(month, period))
+                    for _, area_id, property_type, month, _ in pending
+                }
+                following = {(area_id, property_type, shift_period(start, period)) for area_id, property_type, start in touched}
+                written += self.rollup_periods(period, touched, following - touched)
+            
+            # Keys marked again while this ran keep their newer marked_at and stay queued
+            PendingTrendRollup.objects.filter(
+                id__in=[row[0] for row in pending], marked_at__lte=max(row[4] for row in pending)
+            ).delete()
+        
+        # bulk_create and queryset deletes send no signals, so drop cached trend responses here
+        invalidate_response_cache('market_trends')
+        return written
+    
+    def rollup_periods(self, period, touched, following):
+        """
+        Write the trends of one period length for the given (area, property type, start) keys.
+        
+        A period's average_price is the mean of the prices recorded for its
+        listings during the period, and its sales_volume the number of changes
+        into SOLD from another status.
+        """
+        keys = touched | following
+        # Status in force before each change, read through the (property, recorded_at) index
+        previous_status = Subquery(
+            PropertyPriceHistory.objects
+            .filter(property_id=OuterRef('property_id'), recorded_at__lt=OuterRef('recorded_at'))
+            .order_by('-recorded_at')
+            .values('status')[:1]
+        )
+        rows = (
+            PropertyPriceHistory.objects
+            .filter(
+                property__area_id__in={key[0] for key in keys},
+                property__property_type__in={key[1] for key in keys},
+                # Reach back one period so the earliest key has something to compare against; compared
+                # as timestamps rather than dates so the BRIN index on recorded_at applies
+                recorded_at__gte=period_moment(shift_period(min(key[2] for key in keys), period, -1)),
+                recorded_at__lt=period_moment(shift_period(max(key[2] for key in keys), period)),
+            )
+            .annotate(
+                period_start=Trunc('recorded_at', PERIOD_TRUNC_KINDS[period], output_field=DateField()),
+                previous_status=Coalesce(previous_status, Value('')),
+            )
+            .order_by()
+            .values('property__area_id', 'property__property_type', 'period_start')
+            .annotate(
+                average_price=Avg('price'),
+                sales_volume=Count('id', filter=Q(status=PropertyStatus.SOLD) & ~Q(previous_status=PropertyStatus.SOLD)),
+            )
+        )
+        stats = {(row['property__area_id'], row['property__property_type'], row['period_start']): row for row in rows}
+        
+        trends = []
+        for key in keys:
+            current = stats.get(key)
+            if current is None:
+                continue
+            area_id, property_type, start = key
+            previous = stats.get((area_id, property_type, shift_period(start, period, -1)))
+            average_price = current['average_price'].quantize(Decimal('0.01'))
+            price_change = Decimal('0.00')
+            if previous and previous['average_price']:
+                price_change = (average_price - previous['average_price']) / previous['average_price'] * 100
+                price_change = max(-MAX_PRICE_CHANGE, min(MAX_PRICE_CHANGE, price_change.quantize(Decimal('0.01'))))
+            
+            if price_change > STABLE_THRESHOLD:
+                trend_direction = 'up'
+            elif price_change < -STABLE_THRESHOLD:
+                trend_direction = 'down'
+            else:
+                trend_direction = 'stable'
+            
+            trends.append(self.model(
+                area_id=area_id,
+                property_type=property_type,
+                period=period,
+                period_start_date=start,
+                period_end_date=shift_period(start, period) - timedelta(days=1),
+                average_price=average_price,
+                price_change=price_change,
+                trend_direction=trend_direction,
+                sales_volume=current['sales_volume'],
+            ))
+        
+        self.model.objects.bulk_create(
+            trends,
+            update_conflicts=True,
+            unique_fields=['area', 'property_type', 'period', 'period_start_date'],
+            update_fields=['period_end_date', 'average_price', 'price_change', 'trend_direction', 'sales_volume', 'updated_at'],
+        )
+        
+        # Periods after a touched one are only rewritten when they have price history of their own
+        emptied = [key for key in touched if key not in stats]
+        if emptied:
+            self.model.objects.filter(period=period).filter(reduce(or_, (
+                Q(area_id=area_id, property_type=property_type, period_start_date=start)
+                for area_id, property_type, start in emptied
+            ))).delete()
+        return len(trends)
+
 class MarketTrend(models.Model):
     TREND_CHOICES = (
         ('up', 'Up'),
@@ -54,12 +217,51 @@ class MarketTrend(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = MarketTrendQuerySet.as_manager()
+    
     class Meta:
         unique_together = ('area', 'property_type', 'period', 'period_start_date')
     
     def __str__(self):
         return f"{self.area.name} - {self.get_property_type_display()} - {self.period_start_date.strftime('%b %Y')}"
 
+class PendingTrendRollupQuerySet(models.QuerySet):
+    def mark(self, keys):
+        """Queue (area_id, property_type, month) keys for the next MarketTrend rollup."""
+        now = timezone.now()
+        rows = [
+            PendingTrendRollup(area_id=area_id, property_type=property_type, month=month, marked_at=now)
+            for area_id, property_type, month in set(keys) if area_id
+        ]
+        # Re-marking a queued key moves its marked_at, so a rollup that read the older mark keeps it queued
+        self.model.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['area', 'property_type', 'month'], update_fields=['marked_at']
+        )
+    
+    def mark_properties(self, properties):
+        """Queue the price history months of a Property queryset under its current area and type."""
+        self.mark(
+            PropertyPriceHistory.objects
+            .filter(property__in=properties.exclude(area=None))
+            .annotate(month=TruncMonth('recorded_at', output_field=DateField()))
+            .order_by()
+            .values_list('property__area_id', 'property__property_type', 'month')
+            .distinct()
+        )
+
+class PendingTrendRollup(models.Model):
+    """A month of price history whose MarketTrend periods need recomputing, see MarketTrendQuerySet.rollup."""
+    
+    area = models.ForeignKey('areas.Area', on_delete=models.CASCADE, related_name='+')
+    property_type = models.CharField(max_length=20)
+    month = models.DateField()
+    marked_at = models.DateTimeField()
+    
+    objects = PendingTrendRollupQuerySet.as_manager()
+    
+    class Meta:
+        unique_together = ('area', 'property_type', 'month')
+
 class BlogPost(models.Model):
     title = models.CharField(max_length=255)
     slug = models.SlugField(unique=True, max_length=255)
@@ -70,9 +272,17 @@ class BlogPost(models.Model):
     published_date = models.DateField()
     tags = ArrayField(models.CharField(max_length=50), blank=True, default=list)
     is_published = models.BooleanField(default=True)
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    search_vector_fields = (('title', 'A'), ('excerpt', 'B'), ('content', 'C'))
+    
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='blogpost_search_idx'),
+        ]
+    
     def save(self, *args, **kwargs):
         # Generate slug if not provided
         if not self.slug:
@@ -0,0 +1,64 @@
+
+from django.db.models import DateField
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from luxe_properties.search import update_search_vector
+from luxe_properties.response_cache import invalidate_response_cache
+from properties.models import Property, PropertyPriceHistory
+from .models import MarketReport, MarketTrend, BlogPost, MarketStatistic, PendingTrendRollup, local_month
+
+post_save.connect(update_search_vector, sender=MarketReport, dispatch_uid='report_search_vector')
+post_save.connect(update_search_vector, sender=BlogPost, dispatch_uid='blogpost_search_vector')
+
+@receiver(post_save, sender=MarketReport)
+@receiver(post_delete, sender=MarketReport)
+def invalidate_report_responses(sender, **kwargs):
+    invalidate_response_cache('market_reports')
+
+@receiver(post_save, sender=MarketTrend)
+@receiver(post_delete, sender=MarketTrend)
+def invalidate_trend_responses(sender, **kwargs):
+    invalidate_response_cache('market_trends')
+
+@receiver(post_save, sender=MarketStatistic)
+@receiver(post_delete, sender=MarketStatistic)
+def invalidate_statistic_responses(sender, **kwargs):
+    invalidate_response_cache('market_statistics')
+
+def history_months(property):
+    return set(
+        property.price_history.annotate(month=TruncMonth('recorded_at', output_field=DateField()))
+        .order_by().values_list('month', flat=True)
+    )
+
+@receiver(post_save, sender=PropertyPriceHistory)
+def queue_trend_rollup_on_history(sender, instance, created, **kwargs):
+    """Queue the month of a new price or status change under the listing's area and type."""
+    if created:
+        property = instance.property
+        PendingTrendRollup.objects.mark([(property.area_id, property.property_type, local_month(instance.recorded_at))])
+
+@receiver(post_save, sender=Property)
+def queue_trend_rollup_on_move(sender, instance, created, update_fields=None, **kwargs):
+    """Queue every history month of a listing moved to another area or type, under its old and new keys."""
+    if created or (update_fields and not {'area', 'property_type'}.intersection(update_fields)):
+        return
+    
+    loaded = getattr(instance, '_loaded_values', {})
+    old_key = (loaded.get('area_id', instance.area_id), loaded.get('property_type', instance.property_type))
+    new_key = (instance.area_id, instance.property_type)
+    if old_key == new_key:
+        return
+    
+    months = history_months(instance)
+    PendingTrendRollup.objects.mark([key + (month,) for key in (old_key, new_key) for month in months])
+
+@receiver(pre_delete, sender=Property)
+def queue_trend_rollup_on_delete(sender, instance, **kwargs):
+    # pre_delete, as the history rows are gone by post_delete
+    loaded = getattr(instance, '_loaded_values', {})
+    PendingTrendRollup.objects.mark([
+        (loaded.get('area_id', instance.area_id), loaded.get('property_type', instance.property_type), month)
+        for month in history_months(instance)
+    ])
@@ -8,26 +8,10 @@ from .serializers import (
     BlogPostSerializer,
     MarketStatisticSerializer
 )
-from users.models import UserRole
-
-class IsAdminOrReadOnly(permissions.BasePermission):
-    """
-    Custom permission to only allow admins to edit, but allow anyone to read.
-    """
-    
-    def has_permission(self, request, view):
-        # Read permissions are allowed to any request
-        if request.method in permissions.SAFE_METHODS:
-            return True
-        
-        # Write permissions are only allowed to admins
-        if not request.user.is_authenticated:
-            return False
-        
-        return UserRole.objects.filter(
-            user=request.user,
-            role__in=[UserRole.RoleChoices.ADMIN, UserRole.RoleChoices.SUPERADMIN]
-        ).exists()
+from users.permissions import IsAdminOrReadOnly
+from users.roles import is_admin
+from luxe_properties.search_filter import FullTextSearchFilter
+from luxe_properties.response_cache import CachedResponseMixin
 
 class BlogPostViewPermission(permissions.BasePermission):
     """
@@ -56,25 +40,24 @@ class BlogPostViewPermission(permissions.BasePermission):
             return True
         
         # Admins can do anything
-        return UserRole.objects.filter(
-            user=request.user,
-            role__in=[UserRole.RoleChoices.ADMIN, UserRole.RoleChoices.SUPERADMIN]
-        ).exists()
+        return is_admin(request.user)
 
-class MarketReportViewSet(viewsets.ModelViewSet):
+class MarketReportViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = MarketReport.objects.all()
     serializer_class = MarketReportSerializer
     permission_classes = [IsAdminOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    cache_namespace = 'market_reports'
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, FullTextSearchFilter]
     filterset_fields = ['is_featured']
-    search_fields = ['title', 'summary', 'content']
     ordering_fields = ['published_date', 'created_at']
     lookup_field = 'slug'
 
-class MarketTrendViewSet(viewsets.ModelViewSet):
-    queryset = MarketTrend.objects.all()
+class MarketTrendViewSet(CachedResponseMixin, viewsets.ModelViewSet):
+    # area_name is read for every row
+    queryset = MarketTrend.objects.select_related('area')
     serializer_class = MarketTrendSerializer
     permission_classes = [IsAdminOrReadOnly]
+    cache_namespace = 'market_trends'
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['area', 'property_type', 'period', 'trend_direction']
     ordering_fields = ['period_start_date', 'average_price', 'price_change']
@@ -82,9 +65,8 @@ class MarketTrendViewSet(viewsets.ModelViewSet):
 class BlogPostViewSet(viewsets.ModelViewSet):
     serializer_class = BlogPostSerializer
     permission_classes = [BlogPostViewPermission]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, FullTextSearchFilter]
     filterset_fields = ['tags', 'is_published']
-    search_fields = ['title', 'excerpt', 'content']
     ordering_fields = ['published_date', 'created_at']
     lookup_field = 'slug'
     
@@ -93,12 +75,7 @@ class BlogPostViewSet(viewsets.ModelViewSet):
         
         # Admin users can see all blog posts
         if user.is_authenticated:
-            is_admin = UserRole.objects.filter(
-                user=user,
-                role__in=[UserRole.RoleChoices.ADMIN, UserRole.RoleChoices.SUPERADMIN]
-            ).exists()
-            
-            if is_admin:
+            if is_admin(user):
                 return BlogPost.objects.all()
             
             # Authors can see their own posts (published or not)
@@ -111,10 +88,11 @@ class BlogPostViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-class MarketStatisticViewSet(viewsets.ModelViewSet):
+class MarketStatisticViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = MarketStatistic.objects.all()
     serializer_class = MarketStatisticSerializer
     permission_classes = [IsAdminOrReadOnly]
+    cache_namespace = 'market_statistics'
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['is_featured']
     ordering_fields = ['display_order']
@@ -0,0 +1,32 @@
+
+import django_filters
+from .models import Property, PropertyType, PropertyStatus
+
+class CharListFilter(django_filters.BaseCSVFilter, django_filters.CharFilter):
+    """Comma-separated list of values, e.g. ?features=Pool,Gym."""
+
+class PropertyFilterSet(django_filters.FilterSet):
+    """
+    Property list filters.
+    
+    - min_/max_ bounds on price, area_sqm, bedrooms and bathrooms
+    - property_type and status accept several values (?status=for_sale&status=for_rent)
+    - features keeps properties that have every listed feature
+    """
+    
+    min_price = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
+    max_price = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
+    min_area_sqm = django_filters.NumberFilter(field_name='area_sqm', lookup_expr='gte')
+    max_area_sqm = django_filters.NumberFilter(field_name='area_sqm', lookup_expr='lte')
+    min_bedrooms = django_filters.NumberFilter(field_name='bedrooms', lookup_expr='gte')
+    max_bedrooms = django_filters.NumberFilter(field_name='bedrooms', lookup_expr='lte')
+    min_bathrooms = django_filters.NumberFilter(field_name='bathrooms', lookup_expr='gte')
+    max_bathrooms = django_filters.NumberFilter(field_name='bathrooms', lookup_expr='lte')
+    property_type = django_filters.MultipleChoiceFilter(choices=PropertyType.choices)
+    status = django_filters.MultipleChoiceFilter(choices=PropertyStatus.choices)
+    # Matched against the GIN-indexed feature_names column rather than joining the relation table
+    features = CharListFilter(field_name='feature_names', lookup_expr='contains')
+    
+    class Meta:
+        model = Property
+        fields = ['property_type', 'status', 'bedrooms', 'bathrooms', 'area__id', 'is_featured']
@@ -0,0 +1,360 @@
+
+import csv
+import io
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from areas.models import Area
+from luxe_properties.response_cache import invalidate_response_cache
+from luxe_properties.search import build_search_vector
+from market_insights.models import PendingTrendRollup
+from properties.models import Property, PropertyImage, PropertyFeature, PropertyFeatureRelation
+from users.models import User, UserRole, Agent
+from utils.convert_supabase_to_fixtures import iter_records
+
+USER_STAGING_SQL = """
+CREATE TEMP TABLE import_users (
+    source_id text,
+    email text,
+    first_name text,
+    last_name text,
+    phone_number text,
+    is_staff boolean,
+    is_active boolean,
+    date_joined timestamptz,
+    last_login timestamptz,
+    roles jsonb
+) ON COMMIT DROP
+"""
+
+PROPERTY_STAGING_SQL = """
+CREATE TEMP TABLE import_properties (
+    id bigint,
+    source_id text,
+    title text,
+    description text,
+    property_type text,
+    status text,
+    price numeric,
+    bedrooms integer,
+    bathrooms integer,
+    area_sqm integer,
+    agent_source text,
+    area_id bigint,
+    address text,
+    latitude numeric,
+    longitude numeric,
+    is_featured boolean,
+    created_at timestamptz,
+    updated_at timestamptz,
+    images jsonb,
+    features jsonb
+) ON COMMIT DROP
+"""
+
+UPSERT_USERS_SQL = """
+INSERT INTO users_user (
+    password, is_superuser, email, first_name, last_name, phone_number,
+    is_staff, is_active, date_joined, last_login, role_version
+)
+SELECT DISTINCT ON (email)
+    '!', false, email, COALESCE(first_name, ''), COALESCE(last_name, ''), NULLIF(phone_number, ''),
+    COALESCE(is_staff, false), COALESCE(is_active, true), COALESCE(date_joined, now()), last_login, 0
+FROM import_users
+ORDER BY email
+ON CONFLICT (email) DO UPDATE SET
+    first_name = EXCLUDED.first_name,
+    last_name = EXCLUDED.last_name,
+    phone_number = EXCLUDED.phone_number,
+    is_staff = EXCLUDED.is_staff,
+    is_active = EXCLUDED.is_active,
+    last_login = EXCLUDED.last_login,
+    role_version = users_user.role_version + 1
+"""
+
+# Supabase user id -> Django user id, used for roles, agent profiles and Property.agent
+USER_MAP_SQL = """
+CREATE TEMP TABLE import_user_map ON COMMIT DROP AS
+SELECT DISTINCT ON (s.source_id) s.source_id, u.id AS user_id
+FROM import_users s
+JOIN users_user u ON u.email = s.email
+ORDER BY s.source_id
+"""
+
+UPSERT_ROLES_SQL = """
+INSERT INTO users_userrole (user_id, role)
+SELECT DISTINCT m.user_id, r.role
+FROM import_users s
+JOIN import_user_map m ON m.source_id = s.source_id
+CROSS JOIN LATERAL jsonb_array_elements_text(s.roles) AS r(role)
+ON CONFLICT (user_id, role) DO NOTHING
+"""
+
+UPSERT_AGENTS_SQL = """
+INSERT INTO users_agent (user_id, bio, specialties, years_of_experience, listings_count, sales_volume)
+SELECT DISTINCT r.user_id, '', '', 0, 0, 0
+FROM users_userrole r
+JOIN import_user_map m ON m.user_id = r.user_id
+WHERE r.role = 'agent'
+ON CONFLICT (user_id) DO NOTHING
+"""
+
+# Integer Supabase ids are kept as pks. Other ids (UUIDs) are mapped through Property.source_id,
+# and ids of new ones are drawn from the table's sequence, moved past every pk in use first
+RESOLVE_PROPERTY_IDS_SQL = [
+    """
+    UPDATE import_properties s SET id = p.id
+    FROM properties_property p
+    WHERE s.id IS NULL AND p.source_id = s.source_id
+    """,
+    """
+    SELECT setval(
+        pg_get_serial_sequence('properties_property', 'id'),
+        GREATEST(
+            (SELECT MAX(id) FROM properties_property),
+            (SELECT MAX(id) FROM import_properties),
+            1
+        )
+    )
+    """,
+    """
+    UPDATE import_properties s SET id = n.id
+    FROM (
+        SELECT source_id, nextval(pg_get_serial_sequence('properties_property', 'id')) AS id
+        FROM (SELECT DISTINCT source_id FROM import_properties WHERE id IS NULL AND source_id IS NOT NULL) k
+    ) n
+    WHERE s.id IS NULL AND s.source_id = n.source_id
+    """,
+    # Rows without any source id are always imported as new properties
+    "UPDATE import_properties SET id = nextval(pg_get_serial_sequence('properties_property', 'id')) WHERE id IS NULL",
+]
+
+UPSERT_PROPERTIES_SQL = """
+INSERT INTO properties_property (
+    id, source_id, title, description, property_type, status, price, bedrooms, bathrooms, area_sqm,
+    agent_id, area_id, address, latitude, longitude, is_featured,
+    primary_image, primary_image_variants, primary_image_blurhash, feature_names, created_at, updated_at
+)
+SELECT DISTINCT ON (s.id)
+    s.id, s.source_id, s.title, COALESCE(s.description, ''), s.property_type, s.status, s.price,
+    s.bedrooms, s.bathrooms, s.area_sqm, a.id, ar.id, COALESCE(s.address, ''),
+    s.latitude, s.longitude, COALESCE(s.is_featured, false),
+    '', '{}', '', '{}', COALESCE(s.created_at, now()), COALESCE(s.updated_at, now())
+FROM import_properties s
+LEFT JOIN import_user_map m ON m.source_id = s.agent_source
+LEFT JOIN users_agent a ON a.user_id = m.user_id
+LEFT JOIN areas_area ar ON ar.id = s.area_id
+ORDER BY s.id
+ON CONFLICT (id) DO UPDATE SET
+    title = EXCLUDED.title,
+    description = EXCLUDED.description,
+    property_type = EXCLUDED.property_type,
+    status = EXCLUDED.status,
+    price = EXCLUDED.price,
+    bedrooms = EXCLUDED.bedrooms,
+    bathrooms = EXCLUDED.bathrooms,
+    area_sqm = EXCLUDED.area_sqm,
+    -- Agents missing from this run's users export (or a --properties-only run) keep the current agent
+    agent_id = COALESCE(EXCLUDED.agent_id, properties_property.agent_id),
+    area_id = EXCLUDED.area_id,
+    address = EXCLUDED.address,
+    latitude = EXCLUDED.latitude,
+    longitude = EXCLUDED.longitude,
+    is_featured = EXCLUDED.is_featured,
+    updated_at = EXCLUDED.updated_at
+"""
+
+# Runs before the upsert so prices can be compared with the stored ones; the foreign key
+# to rows the upsert is about to insert is only checked at commit
+RECORD_PRICE_HISTORY_SQL = """
+INSERT INTO properties_propertypricehistory (property_id, price, status, recorded_at)
+SELECT s.id, s.price, s.status, COALESCE(s.updated_at, s.created_at, now())
+FROM (SELECT DISTINCT ON (id) * FROM import_properties ORDER BY id) s
+LEFT JOIN properties_property p ON p.id = s.id
+WHERE p.id IS NULL OR p.price IS DISTINCT FROM s.price OR p.status IS DISTINCT FROM s.status
+"""
+
+# Images and feature relations of imported properties are replaced wholesale
+REPLACE_IMAGES_SQL = [
+    "DELETE FROM properties_propertyimage WHERE property_id IN (SELECT id FROM import_properties)",
+    """
+    INSERT INTO properties_propertyimage (property_id, image, is_primary, blurhash, variants, created_at)
+    SELECT s.id, img.image, img.position = 1, '', '{}', now()
+    FROM (SELECT DISTINCT ON (id) id, images FROM import_properties ORDER BY id) s
+    CROSS JOIN LATERAL jsonb_array_elements_text(s.images) WITH ORDINALITY AS img(image, position)
+    """,
+]
+
+REPLACE_FEATURES_SQL = [
+    """
+    INSERT INTO properties_propertyfeature (name)
+    SELECT DISTINCT f.name
+    FROM import_properties s
+    CROSS JOIN LATERAL jsonb_array_elements_text(s.features) AS f(name)
+    ON CONFLICT (name) DO NOTHING
+    """,
+    "DELETE FROM properties_propertyfeaturerelation WHERE property_id IN (SELECT id FROM import_properties)",
+    """
+    INSERT INTO properties_propertyfeaturerelation (property_id, feature_id)
+    SELECT DISTINCT s.id, pf.id
+    FROM (SELECT DISTINCT ON (id) id, features FROM import_properties ORDER BY id) s
+    CROSS JOIN LATERAL jsonb_array_elements_text(s.features) AS f(name)
+    JOIN properties_propertyfeature pf ON pf.name = f.name
+    ON CONFLICT (property_id, feature_id) DO NOTHING
+    """,
+]
+
+# Text columns that are NOT NULL on Property
+PROPERTY_TEXT_COLUMNS = ('title', 'description', 'property_type', 'status', 'address')
+
+class CopyStream:
+    """File-like object that feeds rows to COPY ... FROM STDIN as CSV without building the whole payload."""
+    
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.pending = ''
+        self.count = 0
+    
+    def read(self, size=-1):
+        size = size if size and size > 0 else 64 * 1024
+        while len(self.pending) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(row)
+            self.count += 1
+            self.pending += self.buffer.getvalue()
+            self.buffer.seek(0)
+            self.buffer.truncate()
+        chunk, self.pending = self.pending[:size], self.pending[size:]
+        return chunk
+
+def user_rows(records):
+    # Same defaults as utils/convert_supabase_to_fixtures.py
+    for i, user in enumerate(records):
+        yield [
+            str(user.get('id', i + 1)),
+            user.get('email') or f"user{i}@example.com",
+            user.get('first_name', ''),
+            user.get('last_name', ''),
+            user.get('phone', ''),
+            user.get('is_staff', False),
+            user.get('is_active', True),
+            user.get('created_at'),
+            user.get('last_login'),
+            json.dumps(user.get('roles', ['user'])),
+        ]
+
+def property_rows(records):
+    for i, prop in enumerate(records):
+        # Integer Supabase ids are kept as pks; other ids are resolved by RESOLVE_PROPERTY_IDS_SQL
+        source_id = prop.get('id')
+        agent_id = prop.get('agent_id')
+        yield [
+            source_id if isinstance(source_id, int) else None,
+            None if source_id is None or isinstance(source_id, int) else str(source_id),
+            prop.get('title', f"Property {i+1}"),
+            prop.get('description', ''),
+            prop.get('property_type', 'apartment').lower(),
+            prop.get('status', 'for_sale'),
+            prop.get('price', 0),
+            prop.get('bedrooms', 0),
+            prop.get('bathrooms', 0),
+            prop.get('area_sqm', 0),
+            None if agent_id is None else str(agent_id),
+            prop.get('area_id'),
+            prop.get('address', ''),
+            prop.get('latitude'),
+            prop.get('longitude'),
+            prop.get('is_featured', False),
+            prop.get('created_at'),
+            prop.get('updated_at'),
+            json.dumps(prop.get('images', [])),
+            json.dumps(list(dict.fromkeys(prop.get('features', [])))),
+        ]
+
+class Command(BaseCommand):
+    help = (
+        'Load Supabase users and properties exports (JSON array or NDJSON) straight into PostgreSQL '
+        'with COPY and set-based upserts. Property.agent_id refers to the Supabase user id from the '
+        'users export of the same run; area_id must match an already loaded area.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--users', help='Path to the Supabase users export.')
+        parser.add_argument('--properties', help='Path to the Supabase properties export.')
+    
+    def handle(self, *args, **options):
+        if not options['users'] and not options['properties']:
+            raise CommandError('Pass --users and/or --properties.')
+        if connection.vendor != 'postgresql':
+            raise CommandError('bulk_import_supabase requires PostgreSQL.')
+        
+        started = time.monotonic()
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(USER_STAGING_SQL)
+            cursor.execute(PROPERTY_STAGING_SQL)
+            
+            if options['users']:
+                self.copy(cursor, 'import_users', user_rows(iter_records(options['users'])))
+                self.run(cursor, 'users', [UPSERT_USERS_SQL])
+            cursor.execute(USER_MAP_SQL)
+            if options['users']:
+                self.run(cursor, 'user roles', [UPSERT_ROLES_SQL])
+                self.run(cursor, 'agent profiles', [UPSERT_AGENTS_SQL])
+            
+            if options['properties']:
+                self.copy(
+                    cursor, 'import_properties', property_rows(iter_records(options['properties'])),
+                    not_null=PROPERTY_TEXT_COLUMNS,
+                )
+                for sql in RESOLVE_PROPERTY_IDS_SQL:
+                    cursor.execute(sql)
+                imported = Property.objects.filter(id__in=RawSQL('SELECT id FROM import_properties', []))
+                # Existing rows may change area or type; queue the trend periods they are leaving
+                PendingTrendRollup.objects.mark_properties(imported)
+                self.run(cursor, 'price history', [RECORD_PRICE_HISTORY_SQL])
+                self.run(cursor, 'properties', [UPSERT_PROPERTIES_SQL])
+                self.run(cursor, 'property images', REPLACE_IMAGES_SQL)
+                self.run(cursor, 'property features', REPLACE_FEATURES_SQL)
+            
+            # Rows were written with explicit ids, so move the sequences past them
+            models = [User, UserRole, Agent, Property, PropertyImage, PropertyFeature, PropertyFeatureRelation]
+            for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
+            
+            if options['properties']:
+                # COPY and raw upserts send no signals, so rebuild what the receivers would have maintained
+                imported.update(search_vector=build_search_vector(Property))
+                imported.refresh_listing_cache()
+                Area.objects.all().recompute_stats()
+                Agent.objects.all().recompute_stats()
+                PendingTrendRollup.objects.mark_properties(imported)
+                invalidate_response_cache('property_facets')
+        
+        self.stdout.write(self.style.SUCCESS(f"Import finished in {time.monotonic() - started:.1f}s."))
+    
+    def copy(self, cursor, table, rows, not_null=()):
+        start = time.monotonic()
+        stream = CopyStream(rows)
+        # CSV COPY reads an empty field as NULL; FORCE_NOT_NULL keeps empty strings for these columns
+        options = f", FORCE_NOT_NULL ({', '.join(not_null)})" if not_null else ''
+        cursor.copy_expert(f"COPY {table} FROM STDIN WITH (FORMAT csv{options})", stream)
+        self.report(f"Staged {table}", stream.count, start)
+    
+    def run(self, cursor, label, statements):
+        start = time.monotonic()
+        for sql in statements:
+            cursor.execute(sql)
+        # The last statement is the one that writes the target rows
+        rows = max(cursor.rowcount, 0)
+        self.report(f"Upserted {label}", rows, start)
+    
+    def report(self, label, rows, start):
+        elapsed = max(time.monotonic() - start, 1e-6)
+        self.stdout.write(f"{label}: {rows} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/s)")
@@ -0,0 +1,69 @@
+
+import os
+import time
+from django.core.management.base import BaseCommand
+from areas.models import Area, AreaImage
+from luxe_properties.images import VARIANT_FORMATS
+from luxe_properties.storage import BLOB_DIR, blob_storage
+from properties.models import Property, PropertyImage
+
+def variant_names(variants):
+    for entry in (variants or {}).values():
+        for extension in VARIANT_FORMATS:
+            if entry.get(extension):
+                yield entry[extension]
+
+def referenced_blobs():
+    """Every blob name still used by an image row, its variants or the denormalized listing copy."""
+    names = set()
+    for model in [PropertyImage, AreaImage]:
+        for image, variants in model.objects.values_list('image', 'variants').iterator():
+            names.add(image)
+            names.update(variant_names(variants))
+    names.update(Area.objects.values_list('image', flat=True).iterator())
+    for image, variants in Property.objects.values_list('primary_image', 'primary_image_variants').iterator():
+        names.add(image)
+        names.update(variant_names(variants))
+    return {name for name in names if name and name.startswith(f'{BLOB_DIR}/')}
+
+class Command(BaseCommand):
+    help = 'Delete content-addressed media blobs that no image row references any more.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help='Keep blobs younger than this; uploads write blobs before their rows commit.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='List the blobs that would be deleted without deleting them.')
+    
+    def handle(self, *args, **options):
+        root = blob_storage.path(BLOB_DIR)
+        if not os.path.isdir(root):
+            self.stdout.write(self.style.SUCCESS("No blobs stored yet."))
+            return
+        
+        # Take the cutoff before reading references, so a blob saved during the scan is always too young
+        cutoff = time.time() - options['grace_hours'] * 60 * 60
+        referenced = referenced_blobs()
+        
+        deleted = kept = freed = 0
+        for shard in os.scandir(root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                name = f'{BLOB_DIR}/{shard.name}/{entry.name}'
+                stat = entry.stat()
+                # Leftover temp files from interrupted saves are collected by the same rule
+                if name in referenced or stat.st_mtime >= cutoff:
+                    kept += 1
+                    continue
+                if options['dry_run']:
+                    self.stdout.write(name)
+                else:
+                    os.remove(entry.path)
+                deleted += 1
+                freed += stat.st_size
+        
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {deleted} unreferenced blobs ({freed / 1024 / 1024:.1f} MB), kept {kept}."
+        ))
@@ -0,0 +1,29 @@
+
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from areas.models import AreaImage
+from luxe_properties.images import run_in_worker
+from properties.models import PropertyImage
+
+class Command(BaseCommand):
+    help = 'Generate responsive variants, dimensions and blurhashes for property and area images.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Reprocess every image, not only those without variants.')
+        parser.add_argument('--workers', type=int, default=max(settings.IMAGE_PROCESSING_WORKERS, 1),
+                            help='Number of images processed in parallel.')
+    
+    def handle(self, *args, **options):
+        total = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for model in [PropertyImage, AreaImage]:
+                queryset = model.objects.all() if options['all'] else model.objects.filter(variants={})
+                pks = list(queryset.values_list('pk', flat=True))
+                # run_in_worker logs failures, so one broken upload doesn't stop the batch
+                list(executor.map(lambda pk: run_in_worker(model, pk, force=options['all']), pks))
+                self.stdout.write(f"Processed {len(pks)} {model._meta.verbose_name_plural}.")
+                total += len(pks)
+        
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} images."))
@@ -0,0 +1,160 @@
+
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import sysconfig
+import time
+from functools import lru_cache
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What each target loads in a fresh interpreter
+TARGETS = {
+    # Every management command and WSGI worker pays for this before doing anything
+    'setup': 'import django; django.setup()',
+    # What a worker imports to route its first request
+    'request': (
+        'import django; django.setup(); '
+        'from django.urls import get_resolver; get_resolver().resolve({path!r})'
+    ),
+}
+
+@lru_cache(maxsize=None)
+def is_stdlib(top_level):
+    """Whether a top-level module belongs to the standard library."""
+    if hasattr(sys, 'stdlib_module_names'):
+        return top_level in sys.stdlib_module_names
+    # Python < 3.10: locate the module without importing it and check where it lives
+    try:
+        spec = importlib.util.find_spec(top_level)
+    except (ImportError, ValueError):
+        return False
+    if spec is None:
+        return False
+    if spec.origin in ('built-in', 'frozen'):
+        return True
+    paths = sysconfig.get_paths()
+    location = os.path.realpath(spec.origin or next(iter(spec.submodule_search_locations or []), ''))
+    return (
+        location.startswith(os.path.realpath(paths['stdlib']) + os.sep)
+        and not location.startswith(os.path.realpath(paths['purelib']) + os.sep)
+    )
+
+def module_group(name):
+    """The app or package an imported module is counted under, e.g. 'django.contrib.admin' or 'rest_framework'."""
+    parts = name.split('.')
+    if is_stdlib(parts[0]):
+        return 'stdlib'
+    if parts[:2] == ['django', 'contrib']:
+        return '.'.join(parts[:3])
+    return parts[0]
+
+def parse_importtime(output):
+    """Map each module to its own import time in microseconds from `python -X importtime` output."""
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(self_us)
+    return modules
+
+def run_once(script, lazy=None):
+    """Run `script` in a fresh interpreter; returns the wall time in ms and each module's import time in us."""
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+    if lazy is not None:
+        env['LAZY_LOADING'] = str(lazy)
+    
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', script],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    wall = (time.perf_counter() - started) * 1000
+    if result.returncode:
+        raise CommandError(result.stderr.strip().splitlines()[-1])
+    return wall, parse_importtime(result.stderr)
+
+def summarize(wall, samples, top):
+    """Medians over the runs, with the import time per app and the slowest modules."""
+    modules = {name: statistics.median(sample.get(name, 0) for sample in samples) for name in samples[-1]}
+    groups = {}
+    for name, self_us in modules.items():
+        total, count = groups.get(module_group(name), (0, 0))
+        groups[module_group(name)] = (total + self_us, count + 1)
+    return {
+        'wall_ms': round(statistics.median(wall), 1),
+        'wall_min_ms': round(min(wall), 1),
+        'import_ms': round(sum(modules.values()) / 1000, 1),
+        'modules': len(modules),
+        'groups': {
+            group: {'import_ms': round(total / 1000, 1), 'modules': count}
+            for group, (total, count) in sorted(groups.items(), key=lambda item: -item[1][0])
+        },
+        'slowest': {
+            name: round(self_us / 1000, 1)
+            for name, self_us in sorted(modules.items(), key=lambda item: -item[1])[:top]
+        },
+    }
+
+class Command(BaseCommand):
+    help = (
+        'Profile cold start: load Django in fresh interpreters with -X importtime and report '
+        'the import cost per app. Use --compare to benchmark LAZY_LOADING against eager loading.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=sorted(TARGETS), default='setup',
+                            help='setup: django.setup() as run by every command and worker; '
+                                 'request: also route --path like a worker\'s first request.')
+        parser.add_argument('--path', default='/api/properties/',
+                            help='URL resolved by the request target.')
+        parser.add_argument('--runs', type=int, default=5,
+                            help='Fresh interpreters started; medians are reported.')
+        parser.add_argument('--top', type=int, default=15,
+                            help='Apps and modules listed.')
+        parser.add_argument('--compare', action='store_true',
+                            help='Profile with LAZY_LOADING off and on and report the difference.')
+        parser.add_argument('--json', action='store_true',
+                            help='Print the results as JSON, e.g. to track them over time.')
+    
+    def handle(self, *args, **options):
+        script = TARGETS[options['target']].format(path=options['path'])
+        modes = {'eager': False, 'lazy': True} if options['compare'] else {'current': None}
+        
+        runs = {mode: ([], []) for mode in modes}
+        # Alternate the modes run by run, so load on the machine affects both alike
+        for _ in range(options['runs']):
+            for mode, lazy in modes.items():
+                wall, modules = run_once(script, lazy)
+                runs[mode][0].append(wall)
+                runs[mode][1].append(modules)
+        results = {mode: summarize(wall, samples, options['top']) for mode, (wall, samples) in runs.items()}
+        
+        if options['json']:
+            self.stdout.write(json.dumps({'target': options['target'], 'runs': options['runs'], **results}, indent=2))
+            return
+        
+        for mode, result in results.items():
+            self.stdout.write(
+                f"{mode}: {result['wall_ms']} ms wall (min {result['wall_min_ms']}), "
+                f"{result['import_ms']} ms importing {result['modules']} modules"
+            )
+            self.stdout.write(f"  {'app':<44} {'ms':>8} {'modules':>8}")
+            for group, cost in list(result['groups'].items())[:options['top']]:
+                self.stdout.write(f"  {group:<44} {cost['import_ms']:>8} {cost['modules']:>8}")
+            self.stdout.write(f"  {'slowest modules':<44} {'ms':>8}")
+            for name, self_ms in result['slowest'].items():
+                self.stdout.write(f"  {name:<44} {self_ms:>8}")
+        
+        if options['compare']:
+            eager, lazy = results['eager']['wall_ms'], results['lazy']['wall_ms']
+            self.stdout.write(self.style.SUCCESS(
+                f"LAZY_LOADING saves {eager - lazy:.1f} ms ({(eager - lazy) / eager:.0%}) per cold start "
+                f"and {results['eager']['modules'] - results['lazy']['modules']} module imports."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Profiled {options['runs']} cold starts of '{options['target']}'."))
@@ -0,0 +1,14 @@
+
+from django.core.management.base import BaseCommand
+from properties.models import Property
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized primary_image and feature_names columns on Property.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of properties to rebuild per UPDATE.')
+    
+    def handle(self, *args, **options):
+        count = Property.objects.all().refresh_listing_cache(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt listing cache for {count} properties."))
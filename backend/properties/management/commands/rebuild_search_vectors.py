@@ -0,0 +1,16 @@
+
+from django.core.management.base import BaseCommand
+from areas.models import Area
+from market_insights.models import MarketReport, BlogPost
+from properties.models import Property
+from luxe_properties.search import build_search_vector
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored full-text search vectors for properties, areas, reports and blog posts.'
+    
+    def handle(self, *args, **options):
+        for model in [Property, Area, MarketReport, BlogPost]:
+            count = model.objects.update(search_vector=build_search_vector(model))
+            self.stdout.write(f"Rebuilt search vectors for {count} {model._meta.verbose_name_plural}.")
+        
+        self.stdout.write(self.style.SUCCESS("Search vectors rebuilt."))
@@ -0,0 +1,374 @@
+
+import io
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from areas.models import Area
+from luxe_properties.response_cache import invalidate_response_cache
+from luxe_properties.search import build_search_vector
+from market_insights.models import MarketTrend, PendingTrendRollup
+from properties.models import (
+    Favorite, Property, PropertyFeature, PropertyFeatureRelation, PropertyImage, PropertyInquiry,
+    PropertyPriceHistory, PropertyStatus, PropertyType,
+)
+from users.models import Agent, User, UserRole
+
+# email, password, first name, last name, superuser, role
+BASELINE_USERS = [
+    ('admin@example.com', 'adminpassword', 'Admin', 'User', True, UserRole.RoleChoices.SUPERADMIN),
+    ('agent@example.com', 'agentpassword', 'Agent', 'User', False, UserRole.RoleChoices.AGENT),
+]
+BASELINE_AGENT = {
+    'email': 'agent@example.com',
+    'bio': 'Experienced real estate agent specializing in luxury properties.',
+    'specialties': 'Luxury Villas, Penthouses',
+    'years_of_experience': 5,
+}
+BASELINE_FEATURES = [
+    'Swimming Pool', 'Gym', 'Balcony', 'Terrace', 'Garden',
+    'Parking', 'Security', '24/7 Concierge', 'Waterfront',
+    'Sea View', 'City View', 'Air Conditioning', 'Furnished',
+    'Pet Friendly', 'Smart Home', 'Private Beach Access',
+]
+BASELINE_AREAS = [
+    ('Downtown Dubai', 'Home to the iconic Burj Khalifa and Dubai Mall.'),
+    ('Palm Jumeirah', 'Luxury artificial island known for high-end residences.'),
+    ('Dubai Marina', 'Cosmopolitan waterfront community with luxury apartments.'),
+    ('Jumeirah', 'Prestigious beachfront area with luxury villas.'),
+]
+
+# Synthetic users share one password, so only one hash is computed however many are created
+SYNTHETIC_PASSWORD = 'password'
+AREA_PREFIXES = ['Al Barsha', 'Arabian', 'Emirates', 'Meydan', 'Al Furjan', 'Saadiyat', 'Yas', 'Al Reem', 'Tilal', 'Mudon']
+AREA_SUFFIXES = ['Marina', 'Hills', 'Bay', 'Gardens', 'Heights', 'Springs', 'Lakes', 'Village', 'Island', 'Creek']
+FIRST_NAMES = ['Omar', 'Layla', 'James', 'Aisha', 'Rahul', 'Sofia', 'Khalid', 'Emma', 'Yousef', 'Priya', 'Lucas', 'Mariam']
+LAST_NAMES = ['Al Mansouri', 'Haddad', 'Smith', 'Khan', 'Sharma', 'Rossi', 'Al Nuaimi', 'Dubois', 'Said', 'Patel']
+STATUS_WEIGHTS = {
+    PropertyStatus.FOR_SALE: 45,
+    PropertyStatus.FOR_RENT: 25,
+    PropertyStatus.SOLD: 15,
+    PropertyStatus.RENTED: 10,
+    PropertyStatus.UNDER_OFFER: 5,
+}
+# Bedroom range and AED per square metre for sale listings
+PROPERTY_PROFILES = {
+    PropertyType.APARTMENT: ((0, 4), (14000, 32000)),
+    PropertyType.VILLA: ((3, 7), (12000, 28000)),
+    PropertyType.PENTHOUSE: ((3, 6), (30000, 60000)),
+    PropertyType.COMMERCIAL: ((0, 0), (9000, 22000)),
+    PropertyType.OFF_PLAN: ((1, 5), (11000, 26000)),
+}
+# Yearly rent as a share of the sale price
+RENTAL_YIELD = Decimal('0.055')
+PLACEHOLDER_IMAGES = 12
+PLACEHOLDER_SIZE = (64, 48)
+
+LISTING_DATES_SQL = """
+UPDATE {table} AS p SET created_at = v.created_at
+FROM (VALUES {values}) AS v(id, created_at)
+WHERE p.id = v.id
+"""
+
+def synthetic_domain(seed):
+    """E-mail domain of a seed's users; finding any of them means the seed is already loaded."""
+    return f'seed{seed}.example.com'
+
+def round_price(value):
+    return Decimal(int(value) // 1000 * 1000)
+
+def placeholder_images(rng):
+    """Save small solid-colour JPEGs; content-addressed storage keeps one blob per colour across runs."""
+    from PIL import Image
+    
+    field = PropertyImage._meta.get_field('image')
+    names = []
+    for _ in range(PLACEHOLDER_IMAGES):
+        buffer = io.BytesIO()
+        Image.new('RGB', PLACEHOLDER_SIZE, tuple(rng.randrange(256) for _ in range(3))).save(buffer, 'JPEG')
+        names.append(field.storage.save(field.generate_filename(None, 'placeholder.jpg'), ContentFile(buffer.getvalue())))
+    return names
+
+class Command(BaseCommand):
+    help = (
+        'Create the baseline users, features and areas (safe to run repeatedly), and optionally a '
+        'synthetic dataset of areas, agents, users, properties, images, favorites and inquiries that '
+        'is the same for the same --seed and arguments. Everything is written with bulk_create in batches.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--areas', type=int, default=0, help='Synthetic areas to create.')
+        parser.add_argument('--agents', type=int, default=0, help='Synthetic agents to create.')
+        parser.add_argument('--users', type=int, default=0,
+                            help='Synthetic customers to create; they own the favorites and some inquiries.')
+        parser.add_argument('--properties', type=int, default=0,
+                            help='Synthetic properties, spread over the synthetic areas and agents.')
+        parser.add_argument('--images', type=int, default=3, help='Placeholder images per synthetic property.')
+        parser.add_argument('--favorites', type=int, default=0, help='Synthetic favorites to create.')
+        parser.add_argument('--inquiries', type=int, default=0, help='Synthetic inquiries to create.')
+        parser.add_argument('--days', type=int, default=730,
+                            help='Synthetic listing dates are spread over this many past days.')
+        parser.add_argument('--seed', type=int, default=1,
+                            help='Random seed; each seed is loaded once and can sit next to other seeds.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per INSERT.')
+    
+    def handle(self, *args, **options):
+        if options['properties'] and not (options['areas'] and options['agents']):
+            raise CommandError('--properties needs --areas and --agents.')
+        if (options['favorites'] or options['inquiries']) and not options['properties']:
+            raise CommandError('--favorites and --inquiries need --properties.')
+        if options['favorites'] and not options['users']:
+            raise CommandError('--favorites needs --users.')
+        
+        started = time.monotonic()
+        with transaction.atomic():
+            self.seed_baseline()
+            if any(options[name] for name in ('areas', 'agents', 'users', 'properties')):
+                self.seed_synthetic(random.Random(options['seed']), options)
+        
+        self.stdout.write(self.style.SUCCESS(f"Seeding finished in {time.monotonic() - started:.1f}s."))
+    
+    def seed_baseline(self):
+        """Insert whichever baseline rows are missing; existing rows, including changed passwords, are kept."""
+        emails = [email for email, *_ in BASELINE_USERS]
+        existing_users = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+        User.objects.bulk_create([
+            User(
+                email=email, password=make_password(password), first_name=first_name, last_name=last_name,
+                is_staff=superuser, is_superuser=superuser,
+            )
+            for email, password, first_name, last_name, superuser, role in BASELINE_USERS if email not in existing_users
+        ], ignore_conflicts=True)
+        
+        user_ids = dict(User.objects.filter(email__in=emails).values_list('email', 'id'))
+        UserRole.objects.bulk_create([
+            UserRole(user_id=user_ids[email], role=role) for email, *_, role in BASELINE_USERS
+        ], ignore_conflicts=True)
+        agent = dict(BASELINE_AGENT)
+        Agent.objects.bulk_create([Agent(user_id=user_ids[agent.pop('email')], **agent)], ignore_conflicts=True)
+        
+        PropertyFeature.objects.bulk_create(
+            [PropertyFeature(name=name) for name in BASELINE_FEATURES], ignore_conflicts=True
+        )
+        
+        # Area names are not unique in the schema, so look the baseline ones up instead of relying on conflicts
+        existing_areas = set(Area.objects.filter(name__in=[name for name, _ in BASELINE_AREAS]).values_list('name', flat=True))
+        areas = Area.objects.bulk_create([
+            Area(name=name, description=description, featured=True)
+            for name, description in BASELINE_AREAS if name not in existing_areas
+        ])
+        if areas:
+            Area.objects.filter(id__in=[area.id for area in areas]).update(search_vector=build_search_vector(Area))
+        
+        self.stdout.write(
+            f"Baseline: {len(emails) - len(existing_users)} users and {len(areas)} areas added, "
+            f"{len(BASELINE_FEATURES)} features ensured."
+        )
+    
+    def seed_synthetic(self, rng, options):
+        domain = synthetic_domain(options['seed'])
+        if User.objects.filter(email__endswith=f'@{domain}').exists():
+            self.stdout.write(self.style.WARNING(
+                f"Synthetic data for seed {options['seed']} is already loaded; pass another --seed to add more."
+            ))
+            return
+        
+        batch_size = options['batch_size']
+        password = make_password(SYNTHETIC_PASSWORD)
+        now = timezone.now()
+        
+        areas = self.create('areas', Area, [
+            Area(
+                name=f"{rng.choice(AREA_PREFIXES)} {rng.choice(AREA_SUFFIXES)} {i + 1}",
+                description=f"Synthetic community {i + 1} generated with seed {options['seed']}.",
+                featured=rng.random() < 0.2,
+                latitude=Decimal(f'{rng.uniform(24.9, 25.35):.6f}'),
+                longitude=Decimal(f'{rng.uniform(55.0, 55.45):.6f}'),
+            )
+            for i in range(options['areas'])
+        ], batch_size)
+        
+        def users(kind, count):
+            return self.create(f'{kind} accounts', User, [
+                User(
+                    email=f'{kind}{i + 1}@{domain}', password=password,
+                    first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                )
+                for i in range(count)
+            ], batch_size)
+        
+        agent_users = users('agent', options['agents'])
+        customers = users('user', options['users'])
+        self.create('user roles', UserRole, [
+            UserRole(user=user, role=UserRole.RoleChoices.AGENT) for user in agent_users
+        ] + [
+            UserRole(user=user, role=UserRole.RoleChoices.USER) for user in customers
+        ], batch_size)
+        agents = self.create('agents', Agent, [
+            Agent(
+                user=user,
+                bio=f"{user.first_name} {user.last_name} has sold homes across the UAE.",
+                specialties=', '.join(rng.sample(PropertyType.labels, 2)),
+                years_of_experience=rng.randint(1, 25),
+            )
+            for user in agent_users
+        ], batch_size)
+        
+        if options['properties']:
+            properties = self.seed_properties(rng, options, areas, agents, now)
+            self.seed_activity(rng, options, properties, customers)
+        
+        # bulk_create sends no signals, so rebuild what the receivers would have maintained
+        start = time.monotonic()
+        area_queryset = Area.objects.filter(id__in=[area.id for area in areas])
+        area_queryset.update(search_vector=build_search_vector(Area))
+        if options['properties']:
+            property_queryset = Property.objects.filter(agent__in=agents)
+            property_queryset.update(search_vector=build_search_vector(Property))
+            area_queryset.recompute_stats(batch_size)
+            Agent.objects.filter(id__in=[agent.id for agent in agents]).recompute_stats(batch_size)
+            PendingTrendRollup.objects.mark_properties(property_queryset)
+            MarketTrend.objects.rollup()
+            invalidate_response_cache('property_facets')
+        self.stdout.write(f"Rebuilt search vectors, stats and trends in {time.monotonic() - start:.2f}s")
+    
+    def seed_properties(self, rng, options, areas, agents, now):
+        batch_size = options['batch_size']
+        features = list(PropertyFeature.objects.order_by('name').values_list('id', 'name'))
+        images = placeholder_images(rng) if options['images'] else []
+        types = list(PROPERTY_PROFILES)
+        statuses, weights = zip(*STATUS_WEIGHTS.items())
+        
+        properties, history, listed, property_features, property_images = [], [], [], [], []
+        for i in range(options['properties']):
+            area = rng.choice(areas)
+            property_type = rng.choice(types)
+            status = rng.choices(statuses, weights)[0]
+            (min_bedrooms, max_bedrooms), (min_rate, max_rate) = PROPERTY_PROFILES[property_type]
+            bedrooms = rng.randint(min_bedrooms, max_bedrooms)
+            area_sqm = rng.randint(40, 90) + bedrooms * rng.randint(35, 80)
+            price = round_price(area_sqm * rng.uniform(min_rate, max_rate))
+            if status in (PropertyStatus.FOR_RENT, PropertyStatus.RENTED):
+                price = round_price(price * RENTAL_YIELD)
+            # Features and photos are picked up front so the denormalized listing columns are inserted
+            # with the row instead of being rebuilt by refresh_listing_cache afterwards
+            chosen_features = sorted(rng.sample(features, min(len(features), rng.randint(2, 6))), key=lambda feature: feature[1])
+            chosen_images = [rng.choice(images) for _ in range(options['images'])] if images else []
+            property_features.append([feature_id for feature_id, _ in chosen_features])
+            property_images.append(chosen_images)
+            
+            properties.append(Property(
+                title=f"{f'{bedrooms} Bedroom ' if bedrooms else ''}{PropertyType(property_type).label} in {area.name}",
+                description=f"Synthetic {PropertyType(property_type).label.lower()} listing {i + 1} in {area.name}.",
+                property_type=property_type,
+                status=status,
+                price=price,
+                bedrooms=bedrooms,
+                bathrooms=max(1, bedrooms + rng.randint(-1, 1)),
+                area_sqm=area_sqm,
+                agent=rng.choice(agents),
+                area=area,
+                address=f"{rng.randint(1, 400)} {area.name} Street",
+                latitude=area.latitude + Decimal(f'{rng.uniform(-0.01, 0.01):.6f}'),
+                longitude=area.longitude + Decimal(f'{rng.uniform(-0.01, 0.01):.6f}'),
+                is_featured=rng.random() < 0.05,
+                primary_image=chosen_images[0] if chosen_images else '',
+                feature_names=[name for _, name in chosen_features],
+            ))
+            listed_at = now - timedelta(seconds=rng.randrange(max(options['days'], 1) * 24 * 60 * 60))
+            listed.append(listed_at)
+            
+            # Closed and under-offer listings went on the market first, sales at an asking price above the final one
+            if status in (PropertyStatus.SOLD, PropertyStatus.UNDER_OFFER):
+                listing = (round_price(price * Decimal(rng.uniform(1.0, 1.08))), PropertyStatus.FOR_SALE)
+            elif status == PropertyStatus.RENTED:
+                listing = (price, PropertyStatus.FOR_RENT)
+            else:
+                listing = None
+            if listing:
+                history.append((i, *listing, listed_at))
+                history.append((i, price, status, listed_at + (now - listed_at) * rng.random()))
+            else:
+                history.append((i, price, status, listed_at))
+        
+        properties = self.create('properties', Property, properties, batch_size)
+        self.set_listing_dates(properties, listed, batch_size)
+        
+        self.create('price history rows', PropertyPriceHistory, [
+            PropertyPriceHistory(property=properties[i], price=price, status=status, recorded_at=recorded_at)
+            for i, price, status, recorded_at in history
+        ], batch_size)
+        self.create('property features', PropertyFeatureRelation, [
+            PropertyFeatureRelation(property=property, feature_id=feature_id)
+            for property, feature_ids in zip(properties, property_features)
+            for feature_id in feature_ids
+        ], batch_size)
+        self.create('property images', PropertyImage, [
+            PropertyImage(
+                property=property, image=image, is_primary=(position == 0),
+                width=PLACEHOLDER_SIZE[0], height=PLACEHOLDER_SIZE[1],
+            )
+            for property, chosen_images in zip(properties, property_images)
+            for position, image in enumerate(chosen_images)
+        ], batch_size)
+        return properties
+    
+    def set_listing_dates(self, properties, listed, batch_size):
+        """created_at is auto_now_add, so the spread listing dates are written in a second pass."""
+        start = time.monotonic()
+        rows = [(property.id, listed_at) for property, listed_at in zip(properties, listed)]
+        # One UPDATE ... FROM (VALUES ...) per batch; bulk_update's CASE per row is far slower at this size
+        with connection.cursor() as cursor:
+            for offset in range(0, len(rows), batch_size):
+                batch = rows[offset:offset + batch_size]
+                cursor.execute(
+                    LISTING_DATES_SQL.format(
+                        table=Property._meta.db_table,
+                        values=', '.join(['(%s, %s::timestamptz)'] * len(batch)),
+                    ),
+                    [value for row in batch for value in row],
+                )
+        self.report('Set listing dates', len(rows), start)
+    
+    def seed_activity(self, rng, options, properties, customers):
+        batch_size = options['batch_size']
+        
+        pairs = set()
+        target = min(options['favorites'], len(customers) * len(properties))
+        while len(pairs) < target:
+            pairs.add((rng.randrange(len(customers)), rng.randrange(len(properties))))
+        self.create('favorites', Favorite, [
+            Favorite(user=customers[user], property=properties[property]) for user, property in sorted(pairs)
+        ], batch_size)
+        
+        inquiries = []
+        for _ in range(options['inquiries']):
+            # Some inquiries come from signed-in customers, the rest from anonymous visitors
+            user = rng.choice(customers) if customers and rng.random() < 0.5 else None
+            name = f"{user.first_name} {user.last_name}" if user else f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            inquiries.append(PropertyInquiry(
+                property=rng.choice(properties),
+                user=user,
+                name=name,
+                email=user.email if user else f"visitor{rng.randrange(10 ** 6)}@example.com",
+                phone=f"+9715{rng.randrange(10 ** 8):08d}" if rng.random() < 0.6 else '',
+                message='I would like to arrange a viewing. Is the price negotiable?',
+                is_processed=rng.random() < 0.5,
+            ))
+        # Created without signals, so no notification e-mails are queued for synthetic inquiries
+        self.create('inquiries', PropertyInquiry, inquiries, batch_size)
+    
+    def create(self, label, model, objs, batch_size):
+        start = time.monotonic()
+        objs = model.objects.bulk_create(objs, batch_size=batch_size)
+        self.report(f"Created {label}", len(objs), start)
+        return objs
+    
+    def report(self, label, rows, start):
+        elapsed = max(time.monotonic() - start, 1e-6)
+        self.stdout.write(f"{label}: {rows} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/s)")
@@ -0,0 +1,119 @@
+
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core import mail
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from properties.models import InquiryNotification
+
+# Retry delays double from RETRY_BASE_DELAY up to RETRY_MAX_DELAY
+RETRY_BASE_DELAY = timedelta(minutes=1)
+RETRY_MAX_DELAY = timedelta(hours=6)
+
+def retry_delay(attempts):
+    return min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+
+def build_digest(agent, notifications):
+    """One e-mail telling an agent about all of their pending inquiries."""
+    inquiries = [notification.inquiry for notification in notifications]
+    if len(inquiries) == 1:
+        subject = f"New inquiry for {inquiries[0].property.title}"
+    else:
+        subject = f"{len(inquiries)} new inquiries for your listings"
+    
+    lines = [f"Hello {agent.user.first_name or agent.user.email},", ""]
+    for inquiry in inquiries:
+        contact = f"{inquiry.name} <{inquiry.email}>"
+        if inquiry.phone:
+            contact += f", {inquiry.phone}"
+        lines += [inquiry.property.title, f"From: {contact}", "", inquiry.message, "", "---", ""]
+    
+    return mail.EmailMessage(
+        subject=subject,
+        body="\n".join(lines),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[agent.user.email],
+        # A single inquiry can be answered straight from the mail client
+        reply_to=[inquiries[0].email] if len(inquiries) == 1 else None,
+    )
+
+class Command(BaseCommand):
+    help = (
+        'Deliver queued inquiry notifications, one digest e-mail per agent per batch. '
+        'Failed digests are retried with exponential backoff.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Notifications claimed per batch.')
+        parser.add_argument('--max-attempts', type=int, default=6,
+                            help='Give up on a notification after this many failed sends.')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling the outbox instead of exiting once it is drained.')
+        parser.add_argument('--interval', type=float, default=30,
+                            help='Seconds between polls with --loop.')
+        parser.add_argument('--keep-days', type=int, default=30,
+                            help='Delete sent notifications older than this.')
+    
+    def handle(self, *args, **options):
+        while True:
+            sent = failed = 0
+            while True:
+                claimed, batch_sent, batch_failed = self.send_batch(options['batch_size'], options['max_attempts'])
+                sent += batch_sent
+                failed += batch_failed
+                if claimed < options['batch_size']:
+                    break
+            
+            expired = timezone.now() - timedelta(days=options['keep_days'])
+            InquiryNotification.objects.filter(sent_at__lt=expired).delete()
+            if sent or failed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f"Sent {sent} notifications, {failed} failed."))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+    
+    def send_batch(self, batch_size, max_attempts):
+        """Claim due notifications, send one digest per agent and record the outcome; returns the counts."""
+        with transaction.atomic():
+            # SKIP LOCKED lets several workers drain the outbox without sending anything twice
+            notifications = list(
+                InquiryNotification.objects.due(max_attempts)
+                .select_related('inquiry__property', 'agent__user')
+                .select_for_update(skip_locked=True, of=('self',))
+                .order_by('next_attempt_at', 'id')[:batch_size]
+            )
+            if not notifications:
+                return 0, 0, 0
+            
+            digests = {}
+            for notification in notifications:
+                digests.setdefault(notification.agent_id, []).append(notification)
+            
+            sent = failed = 0
+            connection = mail.get_connection()
+            try:
+                for agent_notifications in digests.values():
+                    now = timezone.now()
+                    try:
+                        connection.send_messages([build_digest(agent_notifications[0].agent, agent_notifications)])
+                    except Exception as exc:
+                        for notification in agent_notifications:
+                            notification.attempts += 1
+                            notification.next_attempt_at = now + retry_delay(notification.attempts)
+                            notification.last_error = str(exc)[:1000]
+                        failed += len(agent_notifications)
+                    else:
+                        for notification in agent_notifications:
+                            notification.attempts += 1
+                            notification.sent_at = now
+                        sent += len(agent_notifications)
+            finally:
+                connection.close()
+            
+            InquiryNotification.objects.bulk_update(
+                notifications, ['attempts', 'next_attempt_at', 'sent_at', 'last_error']
+            )
+        return len(notifications), sent, failed
@@ -1,5 +1,12 @@
 
-from django.db import models
+from decimal import Decimal
+from django.db import connections, models, transaction
+from django.db.models.functions import Trunc
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.utils import timezone
+from luxe_properties.storage import blob_storage
 from users.models import Agent, User
 
 class PropertyType(models.TextChoices):
@@ -16,6 +23,144 @@ class PropertyStatus(models.TextChoices):
     RENTED = 'rented', 'Rented'
     UNDER_OFFER = 'under_offer', 'Under Offer'
 
+# Closed deals; their prices make up Agent.sales_volume
+CLOSED_STATUSES = (PropertyStatus.SOLD, PropertyStatus.RENTED)
+
+class PropertyQuerySet(models.QuerySet):
+    def with_listing_data(self):
+        """Load everything PropertyListSerializer reads in a single query."""
+        return self.select_related('agent__user', 'area')
+    
+    def with_is_favorited(self, user):
+        """Annotate `is_favorited` for the given user with one EXISTS subquery instead of a query per row."""
+        if not user.is_authenticated:
+            return self.annotate(is_favorited=models.Value(False))
+        return self.annotate(is_favorited=models.Exists(
+            Favorite.objects.filter(user=user, property=models.OuterRef('pk'))
+        ))
+    
+    def refresh_listing_cache(self, batch_size=1000):
+        """Rebuild the denormalized primary image and feature_names columns for these properties."""
+        property_ids = list(self.order_by().values_list('id', flat=True))
+        
+        for start in range(0, len(property_ids), batch_size):
+            batch_ids = property_ids[start:start + batch_size]
+            
+            # Primary image first, then the oldest upload (DISTINCT ON keeps one row per property)
+            primary_images = {
+                property_id: (image, variants, blurhash)
+                for property_id, image, variants, blurhash in
+                PropertyImage.objects.filter(property_id__in=batch_ids)
+                .order_by('property_id', '-is_primary', 'id')
+                .distinct('property_id')
+                .values_list('property_id', 'image', 'variants', 'blurhash')
+            }
+            
+            feature_names = {property_id: [] for property_id in batch_ids}
+            relations = (
+                PropertyFeatureRelation.objects.filter(property_id__in=batch_ids)
+                .order_by('feature__name')
+                .values_list('property_id', 'feature__name')
+            )
+            for property_id, name in relations:
+                feature_names[property_id].append(name)
+            
+            no_image = ('', {}, '')
+            Property.objects.bulk_update(
+                [
+                    Property(
+                        id=property_id,
+                        primary_image=primary_images.get(property_id, no_image)[0],
+                        primary_image_variants=primary_images.get(property_id, no_image)[1],
+                        primary_image_blurhash=primary_images.get(property_id, no_image)[2],
+                        feature_names=feature_names[property_id],
+                    )
+                    for property_id in batch_ids
+                ],
+                self.model.listing_cache_fields,
+            )
+        
+        return len(property_ids)
+
+    def facets(self, price_buckets=10):
+        """
+        Count these properties per type, status, bedrooms and area, plus a price histogram.
+        
+        Everything comes from one GROUPING SETS query over the filtered rows;
+        price buckets split the range between the cheapest and the dearest
+        matching property into equal-width bins.
+        """
+        rows = self.order_by().values(
+            facet_type=models.F('property_type'),
+            facet_status=models.F('status'),
+            facet_bedrooms=models.F('bedrooms'),
+            facet_area=models.F('area_id'),
+            facet_area_name=models.F('area__name'),
+            facet_price=models.F('price'),
+        )
+        sql, params = rows.query.sql_with_params()
+        
+        dimensions = ['facet_type', 'facet_status', 'facet_bedrooms', 'facet_area', 'facet_bucket']
+        query = f"""
+            WITH filtered AS ({sql}),
+            bounds AS (SELECT MIN(facet_price) AS low, MAX(facet_price) AS high FROM filtered)
+            SELECT
+                GROUPING({', '.join(dimensions)}), {', '.join(dimensions)},
+                MAX(facet_area_name), COUNT(*), MIN(facet_price), MAX(facet_price)
+            FROM (
+                SELECT filtered.*, CASE
+                    WHEN bounds.high > bounds.low
+                    THEN LEAST(width_bucket(facet_price, bounds.low, bounds.high, %s), %s)
+                    ELSE 1
+                END AS facet_bucket
+                FROM filtered CROSS JOIN bounds
+            ) AS bucketed
+            GROUP BY GROUPING SETS ({', '.join(f'({dimension})' for dimension in dimensions)}, ())
+        """
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(query, (*params, price_buckets, price_buckets))
+            results = cursor.fetchall()
+        
+        # GROUPING() sets a bit for every dimension a row is not grouped by, first dimension highest
+        full_mask = (1 << len(dimensions)) - 1
+        set_for_mask = {
+            full_mask ^ (1 << (len(dimensions) - 1 - index)): index for index, _ in enumerate(dimensions)
+        }
+        
+        counts = [[] for _ in dimensions]
+        total, low, high = 0, None, None
+        for mask, *values, area_name, count, min_price, max_price in results:
+            if mask == full_mask:
+                total, low, high = count, min_price, max_price
+                continue
+            index = set_for_mask[mask]
+            counts[index].append((values[index], area_name, count))
+        
+        types, statuses, bedrooms, areas, buckets = counts
+        facets = {
+            'count': total,
+            'property_type': [{'value': value, 'count': count} for value, _, count in sorted(types)],
+            'status': [{'value': value, 'count': count} for value, _, count in sorted(statuses)],
+            'bedrooms': [{'value': value, 'count': count} for value, _, count in sorted(bedrooms)],
+            'area': [
+                {'id': area_id, 'name': name, 'count': count}
+                for area_id, name, count in sorted(areas, key=lambda area: area[1] or '')
+                if area_id is not None
+            ],
+            'price': [],
+        }
+        if total:
+            width = (high - low) / price_buckets
+            cents = Decimal('0.01')
+            for bucket, _, count in sorted(buckets):
+                upper = high if bucket == price_buckets or not width else low + width * bucket
+                facets['price'].append({
+                    'min': (low + width * (bucket - 1)).quantize(cents),
+                    'max': upper.quantize(cents),
+                    'count': count,
+                })
+        return facets
+
 class Property(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
@@ -31,54 +176,270 @@ class Property(models.Model):
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     is_featured = models.BooleanField(default=False)
+    # Denormalized listing card data, kept in sync by properties.signals
+    primary_image = models.CharField(max_length=255, blank=True, editable=False)
+    primary_image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    primary_image_blurhash = models.CharField(max_length=64, blank=True, editable=False)
+    feature_names = ArrayField(models.CharField(max_length=100), blank=True, default=list, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Supabase id of a property imported with a non-integer (e.g. UUID) id; integer ids are kept as the pk
+    source_id = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = PropertyQuerySet.as_manager()
+    
+    search_vector_fields = (('title', 'A'), ('address', 'B'), ('description', 'C'))
+    listing_cache_fields = ['primary_image', 'primary_image_variants', 'primary_image_blurhash', 'feature_names']
+    # Stored values of these fields are remembered so signal receivers can apply deltas
+    tracked_fields = ('area_id', 'agent_id', 'price', 'status', 'property_type')
+    
     class Meta:
         verbose_name_plural = 'Properties'
         ordering = ['-created_at']
+        # Keyset pagination walks (ordering field, id) for every PropertyViewSet.ordering_fields entry
+        indexes = [
+            models.Index(fields=['price', 'id'], name='property_price_id_idx'),
+            models.Index(fields=['created_at', 'id'], name='property_created_id_idx'),
+            models.Index(fields=['bedrooms', 'id'], name='property_bedrooms_id_idx'),
+            models.Index(fields=['bathrooms', 'id'], name='property_bathrooms_id_idx'),
+            models.Index(fields=['area_sqm', 'id'], name='property_area_sqm_id_idx'),
+            GinIndex(fields=['search_vector'], name='property_search_idx'),
+            # Serves ?bbox= and the bounding box prefilter of ?near= (luxe_properties.geo)
+            models.Index(fields=['latitude', 'longitude'], name='property_lat_lng_idx'),
+            # PropertyFilterSet: status/type with a price range is the common search, and most
+            # searches only look at listings still on the market
+            models.Index(fields=['status', 'property_type', 'price'], name='property_status_type_price_idx'),
+            models.Index(
+                fields=['property_type', 'price'], name='property_active_type_price_idx',
+                condition=models.Q(status__in=[PropertyStatus.FOR_SALE, PropertyStatus.FOR_RENT]),
+            ),
+            GinIndex(fields=['feature_names'], name='property_feature_names_idx'),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_tracked_values()
+        return instance
+    
+    def save(self, *args, **kwargs):
+        # Receivers maintaining area and agent counters commit or roll back with the row;
+        # they still see the previous values in _loaded_values
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+        self.remember_tracked_values()
+    
+    def remember_tracked_values(self):
+        self._loaded_values = {
+            name: self.__dict__[name] for name in self.tracked_fields if name in self.__dict__
+        }
     
     def __str__(self):
         return self.title
 
 class PropertyImage(models.Model):
     property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField(upload_to='property_images/')
+    image = models.ImageField(storage=blob_storage, upload_to='property_images/', db_index=True)
     is_primary = models.BooleanField(default=False)
+    # Filled in by luxe_properties.images after upload
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    blurhash = models.CharField(max_length=64, blank=True, editable=False)
+    variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"Image for {self.property.title}"
 
+class PropertyFeatureQuerySet(models.QuerySet):
+    def ids_for_names(self, names):
+        """Return {name: id} for the given feature names, creating missing ones in one bulk insert."""
+        names = set(names)
+        if not names:
+            return {}
+        
+        ids = dict(self.filter(name__in=names).values_list('name', 'id'))
+        missing = names - ids.keys()
+        if missing:
+            # ignore_conflicts leaves pks unset, so read back the rows (ours or a concurrent writer's)
+            self.bulk_create([self.model(name=name) for name in missing], ignore_conflicts=True)
+            ids.update(self.filter(name__in=missing).values_list('name', 'id'))
+        return ids
+
 class PropertyFeature(models.Model):
     name = models.CharField(max_length=100, unique=True)
     
+    objects = PropertyFeatureQuerySet.as_manager()
+    
     def __str__(self):
         return self.name
 
+class PropertyFeatureRelationQuerySet(models.QuerySet):
+    def sync(self, names_by_property):
+        """
+        Make each property's features match {property_id: [feature names]}.
+        
+        Only the differences are written: one query for the current relations,
+        one bulk insert for new ones and one delete for dropped ones. Callers
+        refresh the listing cache (see properties.signals.batch_listing_cache_refresh).
+        """
+        if not names_by_property:
+            return
+        
+        feature_ids = PropertyFeature.objects.ids_for_names(
+            name for names in names_by_property.values() for name in names
+        )
+        wanted = {
+            property_id: {feature_ids[name] for name in names}
+            for property_id, names in names_by_property.items()
+        }
+        
+        current = {property_id: set() for property_id in wanted}
+        stale = []
+        for relation_id, property_id, feature_id in self.filter(property_id__in=wanted).values_list(
+            'id', 'property_id', 'feature_id'
+        ):
+            if feature_id in wanted[property_id]:
+                current[property_id].add(feature_id)
+            else:
+                stale.append(relation_id)
+        
+        if stale:
+            self.filter(id__in=stale).delete()
+        
+        self.bulk_create(
+            [
+                self.model(property_id=property_id, feature_id=feature_id)
+                for property_id, feature_ids_wanted in wanted.items()
+                for feature_id in feature_ids_wanted - current[property_id]
+            ],
+            ignore_conflicts=True,
+        )
+
 class PropertyFeatureRelation(models.Model):
     property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='features')
     feature = models.ForeignKey(PropertyFeature, on_delete=models.CASCADE)
     
+    objects = PropertyFeatureRelationQuerySet.as_manager()
+    
     class Meta:
         unique_together = ['property', 'feature']
     
     def __str__(self):
         return f"{self.property.title} - {self.feature.name}"
 
+class PropertyPriceHistoryQuerySet(models.QuerySet):
+    def downsample(self, resolution):
+        """
+        One row per `resolution` bucket ('day', 'week', 'month', 'quarter' or 'year').
+        
+        Each row has the price and status in force at the end of the bucket, the
+        lowest and highest price recorded in it and the number of changes.
+        Buckets without changes are left out; the last earlier price still holds.
+        """
+        bucket = Trunc('recorded_at', resolution)
+        return (
+            self.annotate(
+                bucket=bucket,
+                min_price=models.Window(models.Min('price'), partition_by=bucket),
+                max_price=models.Window(models.Max('price'), partition_by=bucket),
+                changes=models.Window(models.Count('id'), partition_by=bucket),
+            )
+            # DISTINCT ON keeps the latest row of each bucket after the window totals are computed
+            .order_by('bucket', '-recorded_at')
+            .distinct('bucket')
+            .values('bucket', 'price', 'status', 'min_price', 'max_price', 'changes')
+        )
+
+class PropertyPriceHistory(models.Model):
+    """
+    Append-only log of a property's price and status, one row per change.
+    
+    Written by properties.signals when a Property is saved and by the bulk
+    write and import paths; rows are never updated.
+    """
+    
+    # The (property, recorded_at) index below also serves plain property lookups
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='price_history', db_index=False)
+    price = models.DecimalField(max_digits=14, decimal_places=2)
+    status = models.CharField(max_length=20, choices=PropertyStatus.choices)
+    recorded_at = models.DateTimeField(default=timezone.now)
+    
+    objects = PropertyPriceHistoryQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name_plural = 'Property price history'
+        indexes = [
+            # Rows arrive in time order, so a BRIN index serves market-wide time ranges
+            # at a tiny fraction of a B-tree's size
+            BrinIndex(fields=['recorded_at'], name='price_history_recorded_brin'),
+            models.Index(fields=['property', 'recorded_at'], name='price_history_property_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Price history is append-only.')
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return f"{self.property_id}: {self.price} ({self.status}) at {self.recorded_at:%Y-%m-%d}"
+
+class FavoriteQuerySet(models.QuerySet):
+    def toggle(self, user, property):
+        """
+        Remove the favorite if it exists, add it otherwise; returns True when the property is now favorited.
+        
+        Runs as one statement, so concurrent toggles can't interleave between a
+        lookup and the write, and a duplicate insert is dropped by ON CONFLICT.
+        """
+        table = connections[self.db].ops.quote_name(self.model._meta.db_table)
+        query = f"""
+            WITH deleted AS (
+                DELETE FROM {table} WHERE user_id = %s AND property_id = %s RETURNING id
+            ), inserted AS (
+                INSERT INTO {table} (user_id, property_id, created_at)
+                SELECT %s, %s, %s WHERE NOT EXISTS (SELECT 1 FROM deleted)
+                ON CONFLICT DO NOTHING
+                RETURNING id
+            )
+            SELECT NOT EXISTS (SELECT 1 FROM deleted)
+        """
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(query, (user.pk, property.pk, user.pk, property.pk, timezone.now()))
+            return cursor.fetchone()[0]
+
 class Favorite(models.Model):
     property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='favorited_by')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='favorites')
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = FavoriteQuerySet.as_manager()
+    
     class Meta:
         unique_together = ['property', 'user']
+        indexes = [
+            # A user's favorites list, newest first
+            models.Index(fields=['user', '-created_at'], name='favorite_user_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.email} - {self.property.title}"
 
+class PropertyInquiryQuerySet(models.QuerySet):
+    def unprocessed_summary(self):
+        """Unprocessed inquiries per property with the newest one's time, from one grouped query."""
+        return (
+            self.filter(is_processed=False)
+            .order_by()
+            .values('property_id', 'property__title')
+            .annotate(unprocessed=models.Count('id'), latest=models.Max('created_at'))
+            .order_by('-latest')
+        )
+
 class PropertyInquiry(models.Model):
-    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='inquiries')
+    # The (property, is_processed, created_at) index below also serves plain property lookups
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='inquiries', db_index=False)
     name = models.CharField(max_length=100)
     email = models.EmailField()
     phone = models.CharField(max_length=20, blank=True)
@@ -87,9 +448,48 @@ class PropertyInquiry(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_processed = models.BooleanField(default=False)
     
+    objects = PropertyInquiryQuerySet.as_manager()
+    
     class Meta:
         verbose_name_plural = 'Property inquiries'
         ordering = ['-created_at']
+        indexes = [
+            # Agent inboxes: a listing's inquiries, optionally only unprocessed ones, newest first
+            models.Index(fields=['property', 'is_processed', 'created_at'], name='inquiry_property_processed_idx'),
+        ]
     
     def __str__(self):
         return f"Inquiry for {self.property.title} by {self.name}"
+
+class InquiryNotificationQuerySet(models.QuerySet):
+    def due(self, max_attempts):
+        """Unsent notifications whose next attempt is due and that haven't used up their attempts."""
+        return self.filter(sent_at=None, next_attempt_at__lte=timezone.now(), attempts__lt=max_attempts)
+
+class InquiryNotification(models.Model):
+    """
+    Outbox row for telling an agent about a new inquiry.
+    
+    Written by properties.signals in the same transaction as the inquiry, so
+    the public inquiry endpoint never waits for mail; the
+    send_inquiry_notifications command delivers them as per-agent digests.
+    """
+    
+    inquiry = models.OneToOneField(PropertyInquiry, on_delete=models.CASCADE, related_name='notification')
+    agent = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name='inquiry_notifications')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = InquiryNotificationQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # The worker only ever scans unsent rows by due time
+            models.Index(fields=['next_attempt_at'], name='notification_pending_idx', condition=models.Q(sent_at=None)),
+        ]
+    
+    def __str__(self):
+        return f"Notification for inquiry {self.inquiry_id}"
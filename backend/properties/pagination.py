@@ -0,0 +1,145 @@
+
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+def approximate_count(queryset):
+    """Return the planner's row estimate for a queryset instead of running COUNT(*)."""
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+class PropertyPagination(PageNumberPagination):
+    """
+    Page number pagination with an opt-in keyset (cursor) mode.
+
+    - ?page=N keeps the existing PageNumberPagination behaviour
+    - ?pagination=cursor (or any ?cursor=) switches to keyset paging on the
+      requested ordering field with an id tie-breaker, so deep pages cost the
+      same as the first one and no COUNT(*) is run
+    - ?count=approximate adds the planner's row estimate in cursor mode
+    """
+
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    count_query_param = 'count'
+    default_ordering = '-created_at'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.use_cursor = (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        field, descending = self.get_ordering(request, view)
+        cursor = self.decode_cursor(request, queryset.model, field)
+
+        # Walking backwards flips the comparison and the ordering, then the page is reversed
+        reverse = bool(cursor and cursor['reverse'])
+        walk_descending = descending != reverse
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) == 'approximate':
+            self.count = approximate_count(queryset)
+
+        if cursor:
+            # (field, id) < (value, id) written so the leading bound is an index range condition
+            lookup = 'lt' if walk_descending else 'gt'
+            queryset = queryset.filter(**{f'{field}__{lookup}e': cursor['value']}).filter(
+                Q(**{f'{field}__{lookup}': cursor['value']}) | Q(**{f'id__{lookup}': cursor['id']})
+            )
+
+        prefix = '-' if walk_descending else ''
+        queryset = queryset.order_by(f'{prefix}{field}', f'{prefix}id')
+
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        self.field = field
+        self.page_results = results
+        self.has_next = has_more if not reverse else True
+        self.has_previous = bool(cursor) if not reverse else has_more
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+
+        response = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            response['count'] = self.count
+        return Response(response)
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        if not self.has_next or not self.page_results:
+            return None
+        return self.build_cursor_link(self.page_results[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.use_cursor:
+            return super().get_previous_link()
+        if not self.has_previous or not self.page_results:
+            return None
+        return self.build_cursor_link(self.page_results[0], reverse=True)
+
+    def get_ordering(self, request, view):
+        """Resolve the single ordering field the keyset walks on, e.g. '-price'."""
+        ordering = request.query_params.get('ordering', '').split(',')[0].strip() or self.default_ordering
+        field = ordering.lstrip('-')
+        allowed = getattr(view, 'ordering_fields', None) or []
+        if field not in allowed:
+            ordering = self.default_ordering
+            field = ordering.lstrip('-')
+        return field, ordering.startswith('-')
+
+    def build_cursor_link(self, obj, reverse):
+        value = getattr(obj, self.field)
+        payload = {
+            'v': value.isoformat() if hasattr(value, 'isoformat') else str(value),
+            'id': obj.id,
+            'r': int(reverse),
+        }
+        token = urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, model, field):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = json.loads(urlsafe_b64decode(token.encode()).decode())
+            return {
+                'value': model._meta.get_field(field).to_python(payload['v']),
+                'id': int(payload['id']),
+                'reverse': bool(payload.get('r')),
+            }
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
@@ -1,41 +1,71 @@
 
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Property, PropertyImage, PropertyFeature, Favorite, PropertyInquiry, PropertyFeatureRelation
+from areas.models import Area
+from luxe_properties.images import build_srcset
+from luxe_properties.response_cache import invalidate_response_cache
+from luxe_properties.search import build_search_vector
+from market_insights.models import PendingTrendRollup
+from .models import (
+    Property, PropertyImage, PropertyFeature, Favorite, PropertyInquiry, PropertyFeatureRelation, PropertyPriceHistory
+)
+from .signals import batch_listing_cache_refresh
+from users.models import Agent
 from users.serializers import AgentSerializer
 
 class PropertyImageSerializer(serializers.ModelSerializer):
+    srcset = serializers.SerializerMethodField()
+    
     class Meta:
         model = PropertyImage
-        fields = ['id', 'image', 'is_primary']
+        fields = ['id', 'image', 'is_primary', 'width', 'height', 'blurhash', 'srcset']
+    
+    def get_srcset(self, obj):
+        return build_srcset(self.context['request'], obj.image.storage, obj.variants)
 
 class PropertyFeatureSerializer(serializers.ModelSerializer):
     class Meta:
         model = PropertyFeature
         fields = ['id', 'name']
 
+def is_favorited(request, property):
+    # Annotated by PropertyQuerySet.with_is_favorited; a property loaded without it costs one query
+    if hasattr(property, 'is_favorited'):
+        return property.is_favorited
+    if request and request.user.is_authenticated:
+        return Favorite.objects.filter(user=request.user, property=property).exists()
+    return False
+
 class PropertyListSerializer(serializers.ModelSerializer):
     primary_image = serializers.SerializerMethodField()
+    primary_image_srcset = serializers.SerializerMethodField()
+    primary_image_blurhash = serializers.CharField(read_only=True)
     agent_name = serializers.SerializerMethodField()
     area_name = serializers.SerializerMethodField()
-    features = serializers.SerializerMethodField()
+    features = serializers.ListField(source='feature_names', child=serializers.CharField(), read_only=True)
+    distance_km = serializers.SerializerMethodField()
+    is_favorited = serializers.SerializerMethodField()
 
     class Meta:
         model = Property
         fields = ['id', 'title', 'property_type', 'status', 'price', 'bedrooms', 
-                  'bathrooms', 'area_sqm', 'address', 'primary_image', 'agent_name',
-                  'area_name', 'is_featured', 'features']
+                  'bathrooms', 'area_sqm', 'address', 'latitude', 'longitude', 'primary_image',
+                  'primary_image_srcset', 'primary_image_blurhash', 'agent_name', 'area_name',
+                  'is_featured', 'features', 'distance_km', 'is_favorited']
     
     def get_primary_image(self, obj):
-        primary = obj.images.filter(is_primary=True).first()
-        if primary:
-            return self.context['request'].build_absolute_uri(primary.image.url)
-        
-        # If no primary image, return first image or None
-        first_image = obj.images.first()
-        if first_image:
-            return self.context['request'].build_absolute_uri(first_image.image.url)
+        # Served from the denormalized column so a card needs no image query
+        if obj.primary_image:
+            storage = PropertyImage._meta.get_field('image').storage
+            return self.context['request'].build_absolute_uri(storage.url(obj.primary_image))
         return None
     
+    def get_primary_image_srcset(self, obj):
+        # Empty until the variants of a new upload have been generated
+        storage = PropertyImage._meta.get_field('image').storage
+        return build_srcset(self.context['request'], storage, obj.primary_image_variants)
+    
     def get_agent_name(self, obj):
         if obj.agent:
             return f"{obj.agent.user.first_name} {obj.agent.user.last_name}".strip()
@@ -46,13 +76,17 @@ class PropertyListSerializer(serializers.ModelSerializer):
             return obj.area.name
         return None
     
-    def get_features(self, obj):
-        features = PropertyFeatureRelation.objects.filter(property=obj).values_list('feature__name', flat=True)
-        return list(features)
+    def get_distance_km(self, obj):
+        # Only annotated for ?near= searches
+        distance = getattr(obj, 'distance_km', None)
+        return round(distance, 2) if distance is not None else None
+    
+    def get_is_favorited(self, obj):
+        return is_favorited(self.context.get('request'), obj)
 
 class PropertyDetailSerializer(serializers.ModelSerializer):
     images = PropertyImageSerializer(many=True, read_only=True)
-    features = serializers.SerializerMethodField()
+    features = serializers.ListField(source='feature_names', child=serializers.CharField(), read_only=True)
     agent = AgentSerializer(read_only=True)
     area_name = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
@@ -64,20 +98,13 @@ class PropertyDetailSerializer(serializers.ModelSerializer):
                   'address', 'latitude', 'longitude', 'is_featured', 'images',
                   'features', 'created_at', 'updated_at', 'is_favorited']
     
-    def get_features(self, obj):
-        features = PropertyFeatureRelation.objects.filter(property=obj).values_list('feature__name', flat=True)
-        return list(features)
-    
     def get_area_name(self, obj):
         if obj.area:
             return obj.area.name
         return None
     
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Favorite.objects.filter(user=request.user, property=obj).exists()
-        return False
+        return is_favorited(self.context.get('request'), obj)
 
 class PropertyCreateUpdateSerializer(serializers.ModelSerializer):
     images = PropertyImageSerializer(many=True, read_only=True)
@@ -103,18 +130,20 @@ class PropertyCreateUpdateSerializer(serializers.ModelSerializer):
         
         property = Property.objects.create(**validated_data)
         
-        # Add images
-        for image in uploaded_images:
-            PropertyImage.objects.create(
-                property=property,
-                image=image,
-                is_primary=(image == uploaded_images[0])  # First uploaded image is primary
-            )
+        with batch_listing_cache_refresh(property.id):
+            # Add images
+            for image in uploaded_images:
+                PropertyImage.objects.create(
+                    property=property,
+                    image=image,
+                    is_primary=(image == uploaded_images[0])  # First uploaded image is primary
+                )
+            
+            # Add features
+            PropertyFeatureRelation.objects.sync({property.id: features})
         
-        # Add features
-        for feature_name in features:
-            feature, _ = PropertyFeature.objects.get_or_create(name=feature_name)
-            PropertyFeatureRelation.objects.create(property=property, feature=feature)
+        # The listing cache columns were rewritten in SQL; pick them up so a later save doesn't clobber them
+        property.refresh_from_db(fields=Property.listing_cache_fields)
         
         return property
     
@@ -125,26 +154,138 @@ class PropertyCreateUpdateSerializer(serializers.ModelSerializer):
         # Update property fields
         instance = super().update(instance, validated_data)
         
-        # Add new images
-        if uploaded_images:
+        with batch_listing_cache_refresh(instance.id):
+            # Add new images
             for image in uploaded_images:
                 PropertyImage.objects.create(
                     property=instance,
                     image=image
                 )
-        
-        # Update features
-        if features:
-            # Remove existing features
-            PropertyFeatureRelation.objects.filter(property=instance).delete()
             
-            # Add new features
-            for feature_name in features:
-                feature, _ = PropertyFeature.objects.get_or_create(name=feature_name)
-                PropertyFeatureRelation.objects.create(property=instance, feature=feature)
+            # Update features, writing only the added and removed ones
+            if features:
+                PropertyFeatureRelation.objects.sync({instance.id: features})
+        
+        instance.refresh_from_db(fields=Property.listing_cache_fields)
         
         return instance
 
+class PropertyBulkListSerializer(serializers.ListSerializer):
+    """
+    Create and update a batch of properties in one transaction.
+    
+    Items without an id are inserted with one bulk_create, items with an id are
+    written with one bulk_update, and features are diffed for the whole batch.
+    Bulk writes send no model signals, so the listing cache, search vectors,
+    area and agent stats and price history of the touched rows are maintained
+    here in set-based queries.
+    """
+    
+    def validate(self, attrs):
+        ids = [item['id'] for item in attrs if item.get('id') is not None]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError('Each property id may appear only once per batch.')
+        
+        unknown = set(ids) - set(Property.objects.filter(id__in=ids).values_list('id', flat=True))
+        if unknown:
+            raise serializers.ValidationError(f"Unknown property ids: {', '.join(map(str, sorted(unknown)))}.")
+        return attrs
+    
+    def create(self, validated_data):
+        request = self.context.get('request')
+        default_agent = getattr(request.user, 'agent_profile', None) if request else None
+        to_create = [item for item in validated_data if item.get('id') is None]
+        to_update = {item['id']: item for item in validated_data if item.get('id') is not None}
+        features = {}
+        
+        with transaction.atomic():
+            existing = Property.objects.select_for_update().in_bulk(list(to_update))
+            area_ids = {property.area_id for property in existing.values()}
+            agent_ids = {property.agent_id for property in existing.values()}
+            # Updates may move a listing to another area or type; its old trend periods need a rollup too
+            PendingTrendRollup.objects.mark_properties(Property.objects.filter(id__in=list(existing)))
+            
+            created = []
+            for item in to_create:
+                item = dict(item)
+                item.pop('id', None)
+                item_features = item.pop('features', None)
+                # Same default as a single create: an agent's new listings are theirs
+                if not item.get('agent'):
+                    item['agent'] = default_agent
+                property = Property(**item)
+                created.append((property, item_features))
+            Property.objects.bulk_create([property for property, _ in created])
+            for property, item_features in created:
+                if item_features is not None:
+                    features[property.id] = item_features
+            
+            update_fields = {'updated_at'}
+            now = timezone.now()
+            history = [
+                PropertyPriceHistory(property=property, price=property.price, status=property.status, recorded_at=now)
+                for property, _ in created
+            ]
+            for property_id, item in to_update.items():
+                property = existing[property_id]
+                previous = (property.price, property.status)
+                for field, value in item.items():
+                    if field == 'features':
+                        features[property_id] = value
+                    elif field != 'id':
+                        setattr(property, field, value)
+                        update_fields.add(field)
+                property.updated_at = now
+                if (property.price, property.status) != previous:
+                    history.append(PropertyPriceHistory(
+                        property=property, price=property.price, status=property.status, recorded_at=now
+                    ))
+            if existing:
+                Property.objects.bulk_update(existing.values(), sorted(update_fields))
+            PropertyPriceHistory.objects.bulk_create(history)
+            
+            properties = [property for property, _ in created] + list(existing.values())
+            property_ids = [property.id for property in properties]
+            
+            with batch_listing_cache_refresh(*property_ids):
+                PropertyFeatureRelation.objects.sync(features)
+            
+            Property.objects.filter(id__in=property_ids).update(search_vector=build_search_vector(Property))
+            
+            area_ids.update(property.area_id for property in properties)
+            area_ids.discard(None)
+            Area.objects.filter(id__in=area_ids).recompute_stats()
+            agent_ids.update(property.agent_id for property in properties)
+            agent_ids.discard(None)
+            Agent.objects.filter(id__in=agent_ids).recompute_stats()
+            PendingTrendRollup.objects.mark_properties(Property.objects.filter(id__in=property_ids))
+            invalidate_response_cache('property_facets')
+        
+        return properties
+
+class PropertyBulkItemSerializer(PropertyCreateUpdateSerializer):
+    """One entry of a bulk write; items with an id update that property, the rest are created."""
+    
+    id = serializers.IntegerField(required=False)
+    
+    class Meta:
+        model = Property
+        fields = ['id', 'title', 'description', 'property_type', 'status', 'price', 
+                  'bedrooms', 'bathrooms', 'area_sqm', 'agent', 'area', 
+                  'address', 'latitude', 'longitude', 'is_featured', 'features']
+        list_serializer_class = PropertyBulkListSerializer
+    
+    def validate(self, attrs):
+        # Bulk writes run with partial=True so updates may send only changed fields; new rows still need every required one
+        if attrs.get('id') is None:
+            missing = [
+                name for name, field in self.fields.items()
+                if field.required and not field.read_only and name not in attrs
+            ]
+            if missing:
+                raise serializers.ValidationError({name: 'This field is required.' for name in missing})
+        return attrs
+
 class FavoriteSerializer(serializers.ModelSerializer):
     property_details = PropertyListSerializer(source='property', read_only=True)
 
@@ -157,18 +298,40 @@ class FavoriteSerializer(serializers.ModelSerializer):
         }
     
     def create(self, validated_data):
-        user = self.context['request'].user
-        validated_data['user'] = user
-        return super().create(validated_data)
+        # Favoriting twice returns the existing row instead of failing on the unique constraint
+        favorite, _ = Favorite.objects.get_or_create(
+            user=self.context['request'].user, property=validated_data['property']
+        )
+        return favorite
 
 class PropertyInquirySerializer(serializers.ModelSerializer):
+    # Read from the select_related property, see PropertyInquiryViewSet.get_queryset
+    property_title = serializers.CharField(source='property.title', read_only=True)
+    property_thumbnail = serializers.SerializerMethodField()
+    
     class Meta:
         model = PropertyInquiry
-        fields = ['id', 'property', 'name', 'email', 'phone', 'message', 'created_at']
-        read_only_fields = ['created_at']
+        fields = ['id', 'property', 'property_title', 'property_thumbnail', 'name', 'email', 'phone',
+                  'message', 'created_at', 'is_processed']
+        read_only_fields = ['created_at', 'is_processed']
+    
+    def get_property_thumbnail(self, obj):
+        # The thumbnail variant when it has been generated, the original upload otherwise
+        property = obj.property
+        name = (property.primary_image_variants or {}).get('thumbnail', {}).get('jpeg') or property.primary_image
+        if not name:
+            return None
+        storage = PropertyImage._meta.get_field('image').storage
+        return self.context['request'].build_absolute_uri(storage.url(name))
     
     def create(self, validated_data):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             validated_data['user'] = request.user
-        return super().create(validated_data)
+        # The agent notification outbox row is written by a post_save receiver and must commit with the inquiry
+        with transaction.atomic():
+            return super().create(validated_data)
+
+class InquiryMarkProcessedSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=1000)
+    is_processed = serializers.BooleanField(default=True)
@@ -0,0 +1,122 @@
+
+import threading
+from contextlib import contextmanager
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from luxe_properties.images import image_processed, schedule_image_processing
+from luxe_properties.response_cache import invalidate_response_cache
+from luxe_properties.search import update_search_vector
+from .models import (
+    Property, PropertyImage, PropertyFeatureRelation, PropertyPriceHistory, PropertyInquiry, InquiryNotification
+)
+
+_batch = threading.local()
+
+@contextmanager
+def batch_listing_cache_refresh(*property_ids):
+    """
+    Refresh the listing cache once for every property touched inside the block.
+    
+    Image and feature writes inside the block only record their property id;
+    the ids given as arguments are refreshed as well, for bulk writes that
+    send no signals. Nested blocks join the outermost one.
+    """
+    if getattr(_batch, 'pending', None) is not None:
+        _batch.pending.update(property_ids)
+        yield
+        return
+    
+    _batch.pending = set(property_ids)
+    try:
+        yield
+        pending = _batch.pending
+    finally:
+        _batch.pending = None
+    
+    if pending:
+        Property.objects.filter(id__in=pending).refresh_listing_cache()
+
+class ListingCacheRefresh:
+    """on_commit callback refreshing the listing cache of the properties collected in `ids`."""
+    
+    def __init__(self):
+        self.ids = set()
+    
+    def __call__(self):
+        # Once run, later writes queue a new callback instead of joining this one
+        ids, self.ids = self.ids, None
+        Property.objects.filter(id__in=ids).refresh_listing_cache()
+
+def defer_listing_cache_refresh(property_id):
+    """Refresh the property once the current transaction commits, however many of its rows change in it."""
+    # Join the callback already queued in this transaction; a rolled back savepoint drops it from the list
+    for entry in transaction.get_connection().run_on_commit:
+        if isinstance(entry[1], ListingCacheRefresh) and entry[1].ids is not None:
+            entry[1].ids.add(property_id)
+            return
+    refresh = ListingCacheRefresh()
+    refresh.ids.add(property_id)
+    transaction.on_commit(refresh)
+
+def deletes_property(origin):
+    return isinstance(origin, Property) or (isinstance(origin, QuerySet) and origin.model is Property)
+
+@receiver(post_save, sender=PropertyImage)
+@receiver(post_delete, sender=PropertyImage)
+@receiver(post_save, sender=PropertyFeatureRelation)
+@receiver(post_delete, sender=PropertyFeatureRelation)
+def refresh_property_listing_cache(sender, instance, origin=None, **kwargs):
+    """Keep Property.primary_image and Property.feature_names in sync with their source rows."""
+    # Rows removed along with their property leave nothing to refresh
+    if deletes_property(origin):
+        return
+    pending = getattr(_batch, 'pending', None)
+    if pending is not None:
+        pending.add(instance.property_id)
+        return
+    defer_listing_cache_refresh(instance.property_id)
+
+@receiver(post_save, sender=PropertyImage)
+def process_uploaded_property_image(sender, instance, created, **kwargs):
+    if created:
+        schedule_image_processing(PropertyImage, [instance.pk])
+
+@receiver(image_processed, sender=PropertyImage)
+def refresh_listing_cache_after_processing(sender, pk, **kwargs):
+    """Cards read the variants from Property.primary_image_variants."""
+    Property.objects.filter(images__pk=pk).refresh_listing_cache()
+
+@receiver(post_save, sender=Property)
+def record_price_history(sender, instance, created, update_fields=None, **kwargs):
+    """Append a PropertyPriceHistory row when a listing is created or its price or status changes."""
+    if update_fields and not {'price', 'status'}.intersection(update_fields):
+        return
+    
+    if not created:
+        loaded = getattr(instance, '_loaded_values', {})
+        if 'price' in loaded and 'status' in loaded:
+            previous = (loaded['price'], loaded['status'])
+        else:
+            # Saved without being loaded from the database; compare with the last recorded row instead
+            previous = instance.price_history.order_by('-recorded_at').values_list('price', 'status').first()
+        if previous == (instance.price, instance.status):
+            return
+    
+    PropertyPriceHistory.objects.create(property=instance, price=instance.price, status=instance.status)
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+@receiver(post_save, sender=PropertyFeatureRelation)
+@receiver(post_delete, sender=PropertyFeatureRelation)
+def invalidate_property_facets(sender, **kwargs):
+    invalidate_response_cache('property_facets')
+
+post_save.connect(update_search_vector, sender=Property, dispatch_uid='property_search_vector')
+
+@receiver(post_save, sender=PropertyInquiry)
+def queue_inquiry_notification(sender, instance, created, **kwargs):
+    """Queue an e-mail to the listing agent; the row commits or rolls back with the inquiry."""
+    if created and instance.property.agent_id:
+        InquiryNotification.objects.create(inquiry=instance, agent_id=instance.property.agent_id)
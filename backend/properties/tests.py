@@ -0,0 +1,229 @@
+
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPException
+from unittest import skipUnless
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from areas.models import Area
+from users.models import User, UserRole, Agent
+from .filters import PropertyFilterSet
+from .models import (
+    Property, PropertyImage, PropertyFeature, PropertyFeatureRelation, Favorite, PropertyInquiry, InquiryNotification
+)
+
+class ListingQueryCountTests(TestCase):
+    """Listing endpoints cost a fixed number of queries, however many rows a page holds."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='agent@example.com', password='password', first_name='Sara', last_name='Khan')
+        UserRole.objects.create(user=cls.user, role='agent')
+        cls.agent = Agent.objects.create(user=cls.user)
+        area = Area.objects.create(name='Dubai Marina', description='Waterfront living', image='area_images/marina.jpg')
+        features = [PropertyFeature.objects.create(name=name) for name in ('Pool', 'Gym')]
+        
+        # The listing cache columns are filled in when the transaction commits
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.properties = []
+            for i in range(8):
+                property = Property.objects.create(
+                    title=f'Villa {i}', description='Sea view', property_type='villa', status='for_sale',
+                    price=1000000 + i, bedrooms=3, bathrooms=2, area_sqm=250, address='Marina Walk',
+                    agent=cls.agent, area=area,
+                )
+                PropertyImage.objects.create(property=property, image=f'property_images/{i}-side.jpg')
+                PropertyImage.objects.create(property=property, image=f'property_images/{i}-front.jpg', is_primary=True)
+                for feature in features:
+                    PropertyFeatureRelation.objects.create(property=property, feature=feature)
+                Favorite.objects.create(user=cls.user, property=property)
+                PropertyInquiry.objects.create(property=property, name='Omar', email='omar@example.com', message='Still available?')
+                cls.properties.append(property)
+    
+    def setUp(self):
+        self.client = APIClient()
+    
+    def test_property_list(self):
+        # Count and page; images and features come from the listing cache columns
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/properties/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 8)
+        self.assertTrue(response.data['results'][0]['primary_image'].endswith('-front.jpg'))
+    
+    def test_property_list_authenticated(self):
+        # is_favorited is annotated onto the page query
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/properties/')
+        self.assertTrue(all(result['is_favorited'] for result in response.data['results']))
+    
+    def test_property_detail(self):
+        # The property with its agent, user and area joined, the agent's roles and the images
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/properties/{self.properties[0].pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['images']), 2)
+    
+    def test_favorite_list(self):
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/properties/favorites/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 8)
+    
+    def test_inquiry_list(self):
+        # The agent profile lookup, the count and one page query with the properties joined in
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/properties/inquiries/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 8)
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN output and the GIN index are PostgreSQL specific')
+class PropertyFilterIndexTests(TestCase):
+    """Common PropertyFilterSet searches are served by the indexes declared on Property."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(20):
+            Property.objects.create(
+                title=f'Listing {i}', description='Sea view', property_type=('villa', 'apartment')[i % 2],
+                status=('for_sale', 'for_rent', 'sold')[i % 3], price=1000000 + i * 50000,
+                bedrooms=i % 5, bathrooms=2, area_sqm=100 + i, address='Marina Walk',
+                feature_names=['Pool', 'Gym'][:i % 3],
+            )
+    
+    def explain(self, params):
+        queryset = PropertyFilterSet(params, queryset=Property.objects.all()).qs
+        # The table is far too small for the planner to prefer an index on its own
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.order_by().explain()
+    
+    def assertUsesIndex(self, params, *names):
+        plan = self.explain(params)
+        self.assertTrue(any(name in plan for name in names), f'None of {names} in:\n{plan}')
+    
+    def test_status_type_price(self):
+        self.assertUsesIndex(
+            {'status': ['sold'], 'property_type': ['villa'], 'min_price': 1000000, 'max_price': 2000000},
+            'property_status_type_price_idx',
+        )
+    
+    def test_active_type_price(self):
+        self.assertUsesIndex(
+            {'status': ['for_sale', 'for_rent'], 'property_type': ['villa'], 'min_price': 1000000},
+            'property_active_type_price_idx', 'property_status_type_price_idx',
+        )
+    
+    def test_features(self):
+        self.assertUsesIndex({'features': 'Pool,Gym'}, 'property_feature_names_idx')
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise SMTPException('Connection refused')
+
+class InquiryNotificationTests(TestCase):
+    """The inquiry outbox and the send_inquiry_notifications worker, delivering to the locmem mail backend."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.agents = []
+        cls.properties = []
+        for name in ('sara', 'omar'):
+            user = User.objects.create_user(email=f'{name}@example.com', password='password', first_name=name.title())
+            agent = Agent.objects.create(user=user)
+            cls.agents.append(agent)
+            cls.properties.append(Property.objects.create(
+                title=f"{name.title()}'s villa", description='Sea view', property_type='villa', status='for_sale',
+                price=1000000, bedrooms=3, bathrooms=2, area_sqm=250, address='Marina Walk', agent=agent,
+            ))
+    
+    def inquire(self, property, name='Lena'):
+        return PropertyInquiry.objects.create(
+            property=property, name=name, email=f'{name.lower()}@example.com', message='Is it still available?'
+        )
+    
+    def send(self, *args):
+        call_command('send_inquiry_notifications', *args, stdout=StringIO())
+    
+    def test_inquiry_queues_notification_in_its_transaction(self):
+        inquiry = self.inquire(self.properties[0])
+        self.assertEqual(inquiry.notification.agent, self.agents[0])
+        self.assertIsNone(inquiry.notification.sent_at)
+        
+        # Rolling back the inquiry rolls back its notification too
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.inquire(self.properties[1])
+            self.assertEqual(InquiryNotification.objects.count(), 2)
+            raise RuntimeError
+        self.assertEqual(InquiryNotification.objects.count(), 1)
+    
+    def test_one_digest_per_agent(self):
+        self.inquire(self.properties[0], 'Lena')
+        self.inquire(self.properties[0], 'Ravi')
+        self.inquire(self.properties[1], 'Lena')
+        
+        self.send()
+        
+        digests = {message.to[0]: message for message in mail.outbox}
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(digests['sara@example.com'].subject, '2 new inquiries for your listings')
+        self.assertIn('ravi@example.com', digests['sara@example.com'].body)
+        self.assertEqual(digests['omar@example.com'].subject, "New inquiry for Omar's villa")
+        self.assertEqual(digests['omar@example.com'].reply_to, ['lena@example.com'])
+        self.assertFalse(InquiryNotification.objects.filter(sent_at=None).exists())
+        self.assertEqual(set(InquiryNotification.objects.values_list('attempts', flat=True)), {1})
+        
+        # Nothing is sent twice
+        self.send()
+        self.assertEqual(len(mail.outbox), 2)
+    
+    def test_failed_digest_backs_off(self):
+        notification = self.inquire(self.properties[0]).notification
+        
+        with override_settings(EMAIL_BACKEND='properties.tests.FailingEmailBackend'):
+            started = timezone.now()
+            self.send()
+            notification.refresh_from_db()
+            self.assertEqual(notification.attempts, 1)
+            self.assertIsNone(notification.sent_at)
+            self.assertEqual(notification.last_error, 'Connection refused')
+            self.assertGreaterEqual(notification.next_attempt_at, started + timedelta(minutes=1))
+            
+            # Not due yet, so a second run leaves it alone
+            self.send()
+            notification.refresh_from_db()
+            self.assertEqual(notification.attempts, 1)
+            
+            # The delay doubles with each failure
+            InquiryNotification.objects.update(next_attempt_at=timezone.now())
+            started = timezone.now()
+            self.send()
+            notification.refresh_from_db()
+            self.assertEqual(notification.attempts, 2)
+            self.assertGreaterEqual(notification.next_attempt_at, started + timedelta(minutes=2))
+        
+        InquiryNotification.objects.update(next_attempt_at=timezone.now())
+        self.send()
+        notification.refresh_from_db()
+        self.assertEqual(notification.attempts, 3)
+        self.assertIsNotNone(notification.sent_at)
+        self.assertEqual(len(mail.outbox), 1)
+    
+    def test_max_attempts_gives_up(self):
+        self.inquire(self.properties[0])
+        InquiryNotification.objects.update(attempts=3)
+        
+        self.send('--max-attempts', '3')
+        self.assertEqual(mail.outbox, [])
+        self.assertTrue(InquiryNotification.objects.filter(sent_at=None, attempts=3).exists())
+        
+        self.send('--max-attempts', '4')
+        self.assertEqual(len(mail.outbox), 1)
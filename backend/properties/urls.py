@@ -4,10 +4,12 @@ from rest_framework.routers import DefaultRouter
 from .views import PropertyViewSet, PropertyImageViewSet, FavoriteViewSet, PropertyInquiryViewSet
 
 router = DefaultRouter()
-router.register('', PropertyViewSet)
+# Register the prefixed routes first so the property detail route
+# ('<pk>/') does not swallow 'images/', 'favorites/' and 'inquiries/'
 router.register('images', PropertyImageViewSet)
 router.register('favorites', FavoriteViewSet, basename='favorite')
 router.register('inquiries', PropertyInquiryViewSet)
+router.register('', PropertyViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,18 +1,32 @@
 
+from datetime import datetime, time, timedelta
 from rest_framework import viewsets, permissions, filters, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import Property, PropertyImage, PropertyFeature, Favorite, PropertyInquiry
+from .filters import PropertyFilterSet
+from .pagination import PropertyPagination
 from .serializers import (
     PropertyListSerializer, 
     PropertyDetailSerializer,
     PropertyCreateUpdateSerializer,
+    PropertyBulkItemSerializer,
     PropertyImageSerializer,
     FavoriteSerializer,
-    PropertyInquirySerializer
+    PropertyInquirySerializer,
+    InquiryMarkProcessedSerializer
 )
-from users.models import UserRole
+from users.permissions import IsAgentOrAdmin
+from users.roles import is_admin
+from luxe_properties.geo import GeoFilter, MAX_ZOOM, grid_clusters
+from luxe_properties.response_cache import cache_response
+from luxe_properties.uploads import ChunkedImageUploadMixin
+from luxe_properties.search_filter import FullTextSearchFilter
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
     """
@@ -27,37 +41,34 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
         # Write permissions are only allowed to the owner
         return obj.user == request.user
 
-class IsAgentOrAdmin(permissions.BasePermission):
-    """
-    Custom permission to only allow agents or admins to access certain views.
-    """
-    
-    def has_permission(self, request, view):
-        if not request.user.is_authenticated:
-            return False
-        
-        return UserRole.objects.filter(
-            user=request.user,
-            role__in=[UserRole.RoleChoices.AGENT, 
-                     UserRole.RoleChoices.ADMIN, 
-                     UserRole.RoleChoices.SUPERADMIN]
-        ).exists()
-
-class PropertyViewSet(viewsets.ModelViewSet):
+class PropertyViewSet(ChunkedImageUploadMixin, viewsets.ModelViewSet):
     queryset = Property.objects.all()
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['property_type', 'status', 'bedrooms', 'bathrooms', 'area__id', 'is_featured']
-    search_fields = ['title', 'description', 'address', 'area__name']
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, FullTextSearchFilter, GeoFilter]
+    filterset_class = PropertyFilterSet
+    # title, address and description are matched through Property.search_vector
+    search_related_fields = ['area__name']
     ordering_fields = ['price', 'created_at', 'bedrooms', 'bathrooms', 'area_sqm']
     ordering = ['-created_at']
+    pagination_class = PropertyPagination
+    bulk_max_items = 500
+    upload_image_model = PropertyImage
+    upload_parent_field = 'property'
+    max_price_buckets = 50
+    price_history_resolutions = ['day', 'week', 'month', 'quarter', 'year']
     
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'clusters', 'facets', 'price_history']:
             permission_classes = [permissions.AllowAny]
         else:
             permission_classes = [permissions.IsAuthenticated, IsAgentOrAdmin]
         return [permission() for permission in permission_classes]
     
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ['list', 'retrieve']:
+            return queryset.with_listing_data().with_is_favorited(self.request.user)
+        return queryset
+    
     def get_serializer_class(self):
         if self.action == 'list':
             return PropertyListSerializer
@@ -72,18 +83,120 @@ class PropertyViewSet(viewsets.ModelViewSet):
         else:
             serializer.save()
     
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Create and update many properties in one transaction.
+        
+        Expects a list of property objects; entries with an `id` update that
+        property with the fields given, the others are created.
+        """
+        serializer = PropertyBulkItemSerializer(
+            data=request.data, many=True, partial=True,
+            max_length=self.bulk_max_items, allow_empty=False,
+            context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        
+        updated_ids = {item['id'] for item in serializer.validated_data if item.get('id') is not None}
+        properties = serializer.save()
+        
+        return Response({
+            'created': [property.id for property in properties if property.id not in updated_ids],
+            'updated': [property.id for property in properties if property.id in updated_ids],
+        }, status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['get'])
+    def clusters(self, request):
+        """
+        Map markers aggregated into grid cells for ?zoom= (0-20).
+        
+        Takes the same filters as list, typically ?bbox= for the visible map.
+        """
+        try:
+            zoom = int(request.query_params.get('zoom', 10))
+        except ValueError:
+            zoom = -1
+        if not 0 <= zoom <= MAX_ZOOM:
+            return Response({'zoom': f'Must be an integer between 0 and {MAX_ZOOM}.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response({'zoom': zoom, 'clusters': grid_clusters(queryset, zoom)})
+    
+    @action(detail=False, methods=['get'])
+    @cache_response(namespace='property_facets')
+    def facets(self, request):
+        """
+        Counts per property type, status, bedrooms and area plus price buckets.
+        
+        Takes the same filters as list; ?price_buckets= sets the number of
+        histogram bins (default 10).
+        """
+        try:
+            price_buckets = int(request.query_params.get('price_buckets', 10))
+        except ValueError:
+            price_buckets = 0
+        if not 1 <= price_buckets <= self.max_price_buckets:
+            return Response({'price_buckets': f'Must be an integer between 1 and {self.max_price_buckets}.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(queryset.facets(price_buckets=price_buckets))
+    
+    @action(detail=True, methods=['get'], url_path='price-history')
+    def price_history(self, request, pk=None):
+        """
+        Price and status changes of a property, oldest first.
+        
+        ?start= and ?end= (YYYY-MM-DD) limit the range; ?resolution= (day, week,
+        month, quarter or year) returns one point per period with the closing
+        price and the period's low and high instead of every change.
+        """
+        property = self.get_object()
+        history = property.price_history.all()
+        
+        # Compared as timestamps rather than dates so the (property, recorded_at) index applies
+        for param, lookup, offset in [('start', 'recorded_at__gte', 0), ('end', 'recorded_at__lt', 1)]:
+            if request.query_params.get(param):
+                try:
+                    day = parse_date(request.query_params[param])
+                except ValueError:
+                    day = None
+                if day is None:
+                    return Response({param: 'Expected a date as YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
+                moment = timezone.make_aware(datetime.combine(day + timedelta(days=offset), time.min))
+                history = history.filter(**{lookup: moment})
+        
+        resolution = request.query_params.get('resolution')
+        if resolution is None:
+            points = history.order_by('recorded_at').values('recorded_at', 'price', 'status')
+        elif resolution in self.price_history_resolutions:
+            points = [
+                {'recorded_at': point.pop('bucket'), **point}
+                for point in history.downsample(resolution)
+            ]
+        else:
+            return Response({'resolution': f"Must be one of {', '.join(self.price_history_resolutions)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({'resolution': resolution, 'results': list(points)})
+    
+    def check_upload_permission(self, request, property):
+        # Only the listing agent or an admin may add images
+        if not (hasattr(request.user, 'agent_profile') and property.agent == request.user.agent_profile):
+            if not is_admin(request.user):
+                raise PermissionDenied('You do not have permission to add images to this property.')
+    
+    def images_uploaded(self, property, images):
+        Property.objects.filter(pk=property.pk).refresh_listing_cache()
+    
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def add_images(self, request, pk=None):
         property = self.get_object()
         
         # Check if user has permission
-        if not (hasattr(request.user, 'agent_profile') and property.agent == request.user.agent_profile):
-            if not UserRole.objects.filter(
-                user=request.user,
-                role__in=[UserRole.RoleChoices.ADMIN, UserRole.RoleChoices.SUPERADMIN]
-            ).exists():
-                return Response({'detail': 'You do not have permission to add images to this property.'}, 
-                                status=status.HTTP_403_FORBIDDEN)
+        self.check_upload_permission(request, property)
         
         # Upload images
         images = request.FILES.getlist('images')
@@ -102,16 +215,10 @@ class PropertyViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def toggle_favorite(self, request, pk=None):
         property = self.get_object()
-        user = request.user
         
-        favorite = Favorite.objects.filter(user=user, property=property).first()
-        
-        if favorite:
-            favorite.delete()
-            return Response({'detail': 'Property removed from favorites.'}, status=status.HTTP_200_OK)
-        else:
-            Favorite.objects.create(user=user, property=property)
+        if Favorite.objects.toggle(request.user, property):
             return Response({'detail': 'Property added to favorites.'}, status=status.HTTP_201_CREATED)
+        return Response({'detail': 'Property removed from favorites.'}, status=status.HTTP_200_OK)
 
 class PropertyImageViewSet(viewsets.ModelViewSet):
     queryset = PropertyImage.objects.all()
@@ -139,11 +246,19 @@ class FavoriteViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Favorite.objects.filter(user=self.request.user)
+        return Favorite.objects.filter(user=self.request.user).order_by('-created_at').prefetch_related(
+            Prefetch('property', queryset=Property.objects.with_listing_data().with_is_favorited(self.request.user))
+        )
 
 class PropertyInquiryViewSet(viewsets.ModelViewSet):
     queryset = PropertyInquiry.objects.all()
     serializer_class = PropertyInquirySerializer
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['property', 'is_processed']
+    ordering_fields = ['created_at']
+    ordering = ['-created_at']
+    # ?pagination=cursor pages large inboxes on (created_at, id) without counting them
+    pagination_class = PropertyPagination
     
     def get_permissions(self):
         if self.action == 'create':
@@ -157,14 +272,44 @@ class PropertyInquiryViewSet(viewsets.ModelViewSet):
         
         # If user is agent, return inquiries for their properties
         if hasattr(user, 'agent_profile'):
-            return PropertyInquiry.objects.filter(property__agent=user.agent_profile)
-        
+            queryset = PropertyInquiry.objects.filter(property__agent=user.agent_profile)
         # If user is admin, return all inquiries
-        if UserRole.objects.filter(
-            user=user,
-            role__in=[UserRole.RoleChoices.ADMIN, UserRole.RoleChoices.SUPERADMIN]
-        ).exists():
-            return PropertyInquiry.objects.all()
-        
+        elif is_admin(user):
+            queryset = PropertyInquiry.objects.all()
         # For normal users, return their own inquiries
-        return PropertyInquiry.objects.filter(user=user)
+        else:
+            queryset = PropertyInquiry.objects.filter(user=user)
+        
+        # The serializer shows the listing's title and thumbnail; its long text columns aren't needed
+        return queryset.select_related('property').defer(
+            'property__description', 'property__search_vector', 'property__feature_names'
+        )
+    
+    @action(detail=False, methods=['post'])
+    def mark_processed(self, request):
+        """Set is_processed (default true) on the given inquiry ids with one UPDATE."""
+        serializer = InquiryMarkProcessedSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        # Scoped to get_queryset, so agents can only mark inquiries about their own listings
+        updated = PropertyInquiry.objects.filter(
+            id__in=self.get_queryset().filter(id__in=serializer.validated_data['ids']).values('id')
+        ).update(is_processed=serializer.validated_data['is_processed'])
+        return Response({'updated': updated})
+    
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """Unprocessed inquiry counts per property, most recently contacted first."""
+        rows = self.get_queryset().unprocessed_summary()
+        return Response({
+            'unprocessed': sum(row['unprocessed'] for row in rows),
+            'properties': [
+                {
+                    'property': row['property_id'],
+                    'property_title': row['property__title'],
+                    'unprocessed': row['unprocessed'],
+                    'latest': row['latest'],
+                }
+                for row in rows
+            ],
+        })
@@ -0,0 +1,53 @@
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .models import User, TokenUser, Agent
+from .roles import get_role_version
+
+class RoleClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that builds the user from the token's claims.
+    
+    Tokens issued by RoleTokenObtainPairSerializer carry the user's roles and
+    agent profile, so the request needs neither the User row nor a UserRole
+    query. The token's role_version is checked against the cached current
+    version, so tokens issued before a role change are rejected. Tokens
+    without role claims fall back to loading the user from the database.
+    """
+    
+    def get_user(self, validated_token):
+        if 'roles' not in validated_token:
+            return super().get_user(validated_token)
+        
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+        
+        if validated_token.get('role_version') != get_role_version(user_id):
+            raise InvalidToken('Token roles are out of date, please refresh it')
+        
+        return build_token_user(validated_token, user_id)
+
+def build_token_user(token, user_id):
+    """Build a TokenUser from token claims with roles and agent profile pre-cached."""
+    claims = {
+        'id': user_id,
+        'email': token.get('email', ''),
+        'is_staff': token.get('is_staff', False),
+        'is_superuser': token.get('is_superuser', False),
+        # get_role_version only finds active users, so the token was checked against one
+        'is_active': True,
+        'role_version': token.get('role_version', 0),
+    }
+    # Only the claimed fields are set; the others stay deferred and load on first access
+    fields = [field.attname for field in TokenUser._meta.concrete_fields if field.attname in claims]
+    user = TokenUser.from_db(User.objects.db, fields, [claims[name] for name in fields])
+    user._role_cache = frozenset(token.get('roles', []))
+    
+    # Cache the reverse one-to-one so hasattr(user, 'agent_profile') needs no query
+    agent_id = token.get('agent_id')
+    agent = Agent.from_db(Agent.objects.db, ['id', 'user_id'], [agent_id, user_id]) if agent_id else None
+    User._meta.get_field('agent_profile').set_cached_value(user, agent)
+    return user
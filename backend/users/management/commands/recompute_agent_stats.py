@@ -0,0 +1,10 @@
+
+from django.core.management.base import BaseCommand
+from users.models import Agent
+
+class Command(BaseCommand):
+    help = 'Rebuild listings_count and sales_volume for every agent from one grouped query.'
+    
+    def handle(self, *args, **options):
+        count = Agent.objects.all().recompute_stats()
+        self.stdout.write(self.style.SUCCESS(f"Recomputed stats for {count} agents."))
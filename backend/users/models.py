@@ -1,5 +1,6 @@
 
 from django.db import models
+from django.db.models import Count, F, Q, Sum
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.utils.translation import gettext_lazy as _
 
@@ -43,6 +44,8 @@ class User(AbstractUser):
     email = models.EmailField(_('email address'), unique=True)
     phone_number = models.CharField(max_length=20, blank=True, null=True)
     profile_picture = models.ImageField(upload_to='profile_pictures/', blank=True, null=True)
+    # Bumped whenever roles or the agent profile change so older JWT role claims are rejected
+    role_version = models.PositiveIntegerField(default=0, editable=False)
     
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
@@ -52,6 +55,31 @@ class User(AbstractUser):
     def __str__(self):
         return self.email
 
+class TokenUser(User):
+    """
+    A User built from JWT claims by RoleClaimsJWTAuthentication without reading its row.
+    
+    Fields the token does not carry are deferred, so reading one (e.g. first_name)
+    loads it from the database. Saving or deleting is refused because the claims
+    may be stale; load the User row to change it.
+    """
+    
+    class Meta:
+        proxy = True
+    
+    def refresh_from_db(self, using=None, fields=None):
+        # Reading one deferred field loads all of them, rather than one query per field
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred.intersection(fields):
+            fields = deferred.union(fields)
+        super().refresh_from_db(using=using, fields=fields)
+    
+    def save(self, *args, **kwargs):
+        raise ValueError('A user built from token claims cannot be saved; load the User row instead.')
+    
+    def delete(self, *args, **kwargs):
+        raise ValueError('A user built from token claims cannot be deleted; load the User row instead.')
+
 class UserRole(models.Model):
     """User role model for managing different user types."""
     
@@ -70,6 +98,34 @@ class UserRole(models.Model):
     def __str__(self):
         return f"{self.user.email} - {self.role}"
 
+class AgentQuerySet(models.QuerySet):
+    def apply_stats_delta(self, count_delta, volume_delta):
+        """Shift the running listings count and sales volume in one UPDATE."""
+        return self.update(
+            listings_count=F('listings_count') + count_delta,
+            sales_volume=F('sales_volume') + volume_delta,
+        )
+    
+    def recompute_stats(self, batch_size=1000):
+        """Rebuild listings_count and sales_volume for these agents from one grouped query over properties."""
+        from properties.models import CLOSED_STATUSES, Property
+        
+        totals = {
+            row['agent_id']: row
+            for row in Property.objects.filter(agent__in=self).order_by()
+            .values('agent_id').annotate(count=Count('id'), volume=Sum('price', filter=Q(status__in=CLOSED_STATUSES)))
+        }
+        
+        agents = []
+        for agent in self.only('id'):
+            row = totals.get(agent.id)
+            agent.listings_count = row['count'] if row else 0
+            agent.sales_volume = (row['volume'] or 0) if row else 0
+            agents.append(agent)
+        
+        self.model.objects.bulk_update(agents, ['listings_count', 'sales_volume'], batch_size=batch_size)
+        return len(agents)
+
 class Agent(models.Model):
     """Agent model with additional information about real estate agents."""
     
@@ -77,8 +133,12 @@ class Agent(models.Model):
     bio = models.TextField(blank=True)
     specialties = models.CharField(max_length=255, blank=True)
     years_of_experience = models.PositiveSmallIntegerField(default=0)
+    # Kept in sync with the agent's properties by users.signals
     listings_count = models.PositiveIntegerField(default=0)
-    sales_volume = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Running sum of sold and rented listing prices, sized like Area.price_total
+    sales_volume = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    
+    objects = AgentQuerySet.as_manager()
     
     def __str__(self):
         return self.user.email
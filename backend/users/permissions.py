@@ -0,0 +1,30 @@
+
+from rest_framework import permissions
+from .roles import is_admin, is_agent_or_admin
+
+class IsAgentOrAdmin(permissions.BasePermission):
+    """
+    Custom permission to only allow agents or admins to access certain views.
+    """
+    
+    def has_permission(self, request, view):
+        if not request.user.is_authenticated:
+            return False
+        
+        return is_agent_or_admin(request.user)
+
+class IsAdminOrReadOnly(permissions.BasePermission):
+    """
+    Custom permission to only allow admins to edit, but allow anyone to read.
+    """
+    
+    def has_permission(self, request, view):
+        # Read permissions are allowed to any request
+        if request.method in permissions.SAFE_METHODS:
+            return True
+        
+        # Write permissions are only allowed to admins
+        if not request.user.is_authenticated:
+            return False
+        
+        return is_admin(request.user)
@@ -0,0 +1,71 @@
+
+"""
+Role resolution shared by permission classes and querysets.
+
+A user's roles are loaded once and memoised on the user object, which DRF
+creates per request, so a request queries UserRole at most once. When
+ROLE_CACHE_TIMEOUT is set the roles are also kept in the Django cache across
+requests and invalidated by the UserRole signals in users.signals.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from .models import User, UserRole
+
+ADMIN_ROLES = frozenset([UserRole.RoleChoices.ADMIN, UserRole.RoleChoices.SUPERADMIN])
+AGENT_OR_ADMIN_ROLES = ADMIN_ROLES | {UserRole.RoleChoices.AGENT}
+
+def role_cache_key(user_id):
+    return f'user_roles:{user_id}'
+
+def get_roles(user):
+    """Return the set of role names for a user, loading them at most once per request."""
+    if not user or not user.is_authenticated:
+        return frozenset()
+
+    roles = getattr(user, '_role_cache', None)
+    if roles is not None:
+        return roles
+
+    timeout = getattr(settings, 'ROLE_CACHE_TIMEOUT', 0)
+    roles = cache.get(role_cache_key(user.pk)) if timeout else None
+    if roles is None:
+        roles = frozenset(UserRole.objects.filter(user_id=user.pk).values_list('role', flat=True))
+        if timeout:
+            cache.set(role_cache_key(user.pk), roles, timeout)
+
+    user._role_cache = roles
+    return roles
+
+def has_role(user, roles):
+    """Check whether a user holds any of the given roles."""
+    return not get_roles(user).isdisjoint(roles)
+
+def is_admin(user):
+    return has_role(user, ADMIN_ROLES)
+
+def is_agent_or_admin(user):
+    return has_role(user, AGENT_OR_ADMIN_ROLES)
+
+def invalidate_roles(user_id):
+    """Drop the cross-request cache entry for a user after their roles change."""
+    cache.delete(role_cache_key(user_id))
+
+def role_version_cache_key(user_id):
+    return f'user_role_version:{user_id}'
+
+def get_role_version(user_id):
+    """Return the current role version for a user, or None if the user no longer exists."""
+    key = role_version_cache_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = User.objects.filter(pk=user_id, is_active=True).values_list('role_version', flat=True).first()
+        if version is not None:
+            cache.set(key, version, getattr(settings, 'ROLE_VERSION_CACHE_TIMEOUT', 60))
+    return version
+
+def bump_role_version(user_id):
+    """Invalidate role claims in already issued tokens for a user."""
+    User.objects.filter(pk=user_id).update(role_version=F('role_version') + 1)
+    cache.delete(role_version_cache_key(user_id))
+    invalidate_roles(user_id)
@@ -1,7 +1,11 @@
 
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
 from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from .models import UserRole, Agent
+from .roles import get_roles
 
 User = get_user_model()
 
@@ -86,3 +90,49 @@ class RegisterSerializer(serializers.ModelSerializer):
         UserRole.objects.create(user=user, role=UserRole.RoleChoices.USER)
         
         return user
+
+def add_role_claims(token, user):
+    """Embed roles and agent profile in a token so RoleClaimsJWTAuthentication can skip the DB."""
+    token['email'] = user.email
+    token['is_staff'] = user.is_staff
+    token['is_superuser'] = user.is_superuser
+    token['roles'] = sorted(get_roles(user))
+    token['agent_id'] = Agent.objects.filter(user=user).values_list('id', flat=True).first()
+    token['role_version'] = user.role_version
+    return token
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Issue access/refresh tokens that carry role and agent profile claims."""
+    
+    @classmethod
+    def get_token(cls, user):
+        return add_role_claims(super().get_token(user), user)
+
+class RoleTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh an access token with role claims re-read from the database."""
+    
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        
+        user = User.objects.filter(pk=refresh[api_settings.USER_ID_CLAIM], is_active=True).first()
+        if user is None:
+            raise AuthenticationFailed('User not found or inactive.', code='user_not_found')
+        add_role_claims(refresh, user)
+        
+        data = {'access': str(refresh.access_token)}
+        
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    # Blacklist app not installed
+                    pass
+            
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            
+            data['refresh'] = str(refresh)
+        
+        return data
@@ -0,0 +1,87 @@
+
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from properties.models import CLOSED_STATUSES, Property
+from .models import User, UserRole, Agent
+from .roles import bump_role_version
+
+# User fields copied into access tokens by users.serializers.add_role_claims
+TOKEN_CLAIM_FIELDS = ('email', 'is_staff', 'is_superuser', 'is_active')
+
+@receiver(post_save, sender=UserRole)
+@receiver(post_delete, sender=UserRole)
+def invalidate_cached_roles(sender, instance, **kwargs):
+    """Drop cached roles and stale token claims so the next request sees the change."""
+    bump_role_version(instance.user_id)
+
+@receiver(post_save, sender=Agent)
+def invalidate_agent_claim_on_create(sender, instance, created, **kwargs):
+    if created:
+        bump_role_version(instance.user_id)
+
+@receiver(post_delete, sender=Agent)
+def invalidate_agent_claim_on_delete(sender, instance, **kwargs):
+    bump_role_version(instance.user_id)
+
+@receiver(pre_save, sender=User)
+def detect_token_claim_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Note whether a save changes a field that issued tokens carry as a claim."""
+    instance._token_claims_changed = False
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not set(TOKEN_CLAIM_FIELDS).intersection(update_fields):
+        return
+    
+    current = User.objects.filter(pk=instance.pk).values(*TOKEN_CLAIM_FIELDS).first()
+    instance._token_claims_changed = current is not None and any(
+        current[name] != getattr(instance, name) for name in TOKEN_CLAIM_FIELDS
+    )
+
+@receiver(post_save, sender=User)
+def invalidate_token_claims(sender, instance, **kwargs):
+    """Reject tokens issued before e.g. is_staff was revoked, as they would still grant it."""
+    if getattr(instance, '_token_claims_changed', False):
+        bump_role_version(instance.pk)
+        # Keep the instance's copy current, so saving it again doesn't restore the old version
+        instance.refresh_from_db(fields=['role_version'])
+
+def sales_value(price, status):
+    return price if status in CLOSED_STATUSES else 0
+
+@receiver(post_save, sender=Property)
+def apply_agent_stats_on_save(sender, instance, created, update_fields=None, **kwargs):
+    """Move the listing between agents' running counters instead of re-aggregating."""
+    if update_fields and not {'agent', 'price', 'status'}.intersection(update_fields):
+        return
+    
+    volume = sales_value(instance.price, instance.status)
+    if created:
+        if instance.agent_id:
+            Agent.objects.filter(pk=instance.agent_id).apply_stats_delta(1, volume)
+        return
+    
+    loaded = getattr(instance, '_loaded_values', None)
+    if loaded is None or not {'agent_id', 'price', 'status'} <= loaded.keys():
+        # Saved without being loaded from the database; the old values are unknown
+        if instance.agent_id:
+            Agent.objects.filter(pk=instance.agent_id).recompute_stats()
+        return
+    
+    old_agent_id, old_volume = loaded['agent_id'], sales_value(loaded['price'], loaded['status'])
+    if old_agent_id == instance.agent_id:
+        if old_agent_id and old_volume != volume:
+            Agent.objects.filter(pk=old_agent_id).apply_stats_delta(0, volume - old_volume)
+        return
+    
+    if old_agent_id:
+        Agent.objects.filter(pk=old_agent_id).apply_stats_delta(-1, -old_volume)
+    if instance.agent_id:
+        Agent.objects.filter(pk=instance.agent_id).apply_stats_delta(1, volume)
+
+@receiver(post_delete, sender=Property)
+def apply_agent_stats_on_delete(sender, instance, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    agent_id = loaded.get('agent_id', instance.agent_id)
+    if agent_id:
+        volume = sales_value(loaded.get('price', instance.price), loaded.get('status', instance.status))
+        Agent.objects.filter(pk=agent_id).apply_stats_delta(-1, -volume)
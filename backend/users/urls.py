@@ -3,6 +3,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from .views import UserViewSet, AgentViewSet, RegisterView, get_user_roles, LogoutView
+from .serializers import RoleTokenObtainPairSerializer, RoleTokenRefreshSerializer
 
 router = DefaultRouter()
 router.register('profiles', UserViewSet)
@@ -11,8 +12,8 @@ router.register('agents', AgentViewSet)
 urlpatterns = [
     path('', include(router.urls)),
     path('register/', RegisterView.as_view(), name='register'),
-    path('login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('login/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('login/', TokenObtainPairView.as_view(serializer_class=RoleTokenObtainPairSerializer), name='token_obtain_pair'),
+    path('login/refresh/', TokenRefreshView.as_view(serializer_class=RoleTokenRefreshSerializer), name='token_refresh'),
     path('logout/', LogoutView.as_view(), name='logout'),
     path('roles/', get_user_roles, name='user_roles'),
 ]
@@ -4,8 +4,9 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework_simplejwt.tokens import RefreshToken
-from .models import User, UserRole, Agent
+from .models import User, Agent
 from .serializers import UserSerializer, AgentSerializer, RegisterSerializer
+from .roles import get_roles, is_admin
 
 class RegisterView(generics.CreateAPIView):
     """View for user registration."""
@@ -25,12 +26,7 @@ class UserViewSet(viewsets.ModelViewSet):
         user = self.request.user
         
         # Check if user has admin or superadmin role
-        is_admin = UserRole.objects.filter(
-            user=user, 
-            role__in=[UserRole.RoleChoices.ADMIN, UserRole.RoleChoices.SUPERADMIN]
-        ).exists()
-        
-        if is_admin:
+        if is_admin(user):
             return User.objects.all()
         else:
             return User.objects.filter(id=user.id)
@@ -39,7 +35,8 @@ class AgentViewSet(viewsets.ModelViewSet):
     """ViewSet for viewing and editing agent instances."""
     
     serializer_class = AgentSerializer
-    queryset = Agent.objects.all()
+    # AgentSerializer nests the user with its roles
+    queryset = Agent.objects.select_related('user').prefetch_related('user__roles')
     
     def get_permissions(self):
         """Set permissions based on action."""
@@ -57,8 +54,7 @@ def get_user_roles(request):
         return Response({"detail": "Authentication credentials were not provided."}, 
                         status=status.HTTP_401_UNAUTHORIZED)
     
-    roles = UserRole.objects.filter(user=request.user).values_list('role', flat=True)
-    return Response({"roles": list(roles)})
+    return Response({"roles": sorted(get_roles(request.user))})
 
 class LogoutView(APIView):
     """Logout view to blacklist the refresh token."""
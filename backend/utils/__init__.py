@@ -0,0 +1,2 @@
+
+# This file intentionally left empty to mark directory as Python package
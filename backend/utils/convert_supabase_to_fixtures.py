@@ -4,19 +4,142 @@
 Utility script to convert Supabase JSON exports to Django fixtures.
 
 This script can be used to migrate data from Supabase to Django.
+
+Exports are read incrementally, either as a JSON array or as NDJSON (one
+object per line), and fixtures are written as a stream, so memory use does not
+grow with the size of the export. Use --shard-size to split the output into
+several fixture files and load them together with a single `loaddata` call.
 """
 import os
 import json
 import argparse
 from datetime import datetime
 
-def convert_users(supabase_data, output_file):
+READ_CHUNK_SIZE = 1024 * 1024
+
+def iter_records(input_file):
+    """Yield the objects of a Supabase export, one at a time."""
+    with open(input_file, 'r') as f:
+        first = ''
+        while not first:
+            char = f.read(1)
+            if not char:
+                return
+            if not char.isspace():
+                first = char
+        
+        if first == '[':
+            yield from iter_json_array(f)
+        else:
+            # NDJSON: the first line starts with the character already read
+            line = first + f.readline()
+            while line:
+                if line.strip():
+                    yield json.loads(line)
+                line = f.readline()
+
+def iter_json_array(f):
+    """Decode the elements of a JSON array from a file positioned just after the opening bracket."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    # Index of the first unconsumed character; the consumed prefix is only dropped when reading more
+    position = 0
+    eof = False
+    
+    while True:
+        # Skip separators between elements
+        while True:
+            while position < len(buffer) and (buffer[position].isspace() or buffer[position] == ','):
+                position += 1
+            if position < len(buffer) or eof:
+                break
+            buffer, position = f.read(READ_CHUNK_SIZE), 0
+            eof = not buffer
+        
+        if position == len(buffer) or buffer[position] == ']':
+            return
+        
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            record, end = None, None
+        
+        # A value that runs into the end of the buffer may be cut short, so read more first
+        if end is None or (end == len(buffer) and not eof):
+            if eof:
+                raise ValueError('Truncated or invalid JSON array in export')
+            chunk = f.read(READ_CHUNK_SIZE)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        
+        yield record
+        position = end
+
+class FixtureWriter:
+    """
+    Write fixture objects as a JSON array, optionally sharded into several files.
+    
+    With shard_size set, output.json becomes output-0001.json, output-0002.json, ...
+    each holding at most shard_size objects.
+    """
+    
+    def __init__(self, output_file, shard_size=None, indent=None):
+        self.output_file = output_file
+        self.shard_size = shard_size
+        self.indent = indent
+        self.files = []
+        self.count = 0
+        self.shard_count = 0
+        self.handle = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close_shard()
+    
+    def shard_path(self):
+        if not self.shard_size:
+            return self.output_file
+        root, ext = os.path.splitext(self.output_file)
+        return f"{root}-{len(self.files) + 1:04d}{ext or '.json'}"
+    
+    def open_shard(self):
+        path = self.shard_path()
+        self.handle = open(path, 'w')
+        self.handle.write('[')
+        self.files.append(path)
+        self.shard_count = 0
+    
+    def close_shard(self):
+        if self.handle is None:
+            if not self.files:
+                # Always leave a loadable (empty) fixture behind
+                self.open_shard()
+            else:
+                return
+        self.handle.write('\n]\n')
+        self.handle.close()
+        self.handle = None
+    
+    def write(self, obj):
+        if self.handle is None:
+            self.open_shard()
+        self.handle.write('\n' if self.shard_count == 0 else ',\n')
+        self.handle.write(json.dumps(obj, indent=self.indent))
+        self.count += 1
+        self.shard_count += 1
+        if self.shard_size and self.shard_count >= self.shard_size:
+            self.close_shard()
+
+def convert_users(records, writer):
     """Convert Supabase users to Django users."""
-    django_users = []
-    django_roles = []
+    user_count = 0
+    role_count = 0
     
-    for i, user in enumerate(supabase_data):
-        django_user = {
+    for i, user in enumerate(records):
+        writer.write({
             "model": "users.user",
             "pk": i + 1,
             "fields": {
@@ -29,39 +152,34 @@ def convert_users(supabase_data, output_file):
                 "date_joined": user.get("created_at", datetime.now().isoformat()),
                 "last_login": user.get("last_login", None)
             }
-        }
+        })
+        user_count += 1
         
         # Add roles for the user
         for role in user.get("roles", ["user"]):
-            django_roles.append({
+            role_count += 1
+            writer.write({
                 "model": "users.userrole",
-                "pk": len(django_roles) + 1,
+                "pk": role_count,
                 "fields": {
                     "user": i + 1,
                     "role": role
                 }
             })
-        
-        django_users.append(django_user)
-    
-    # Combine users and roles
-    fixtures = django_users + django_roles
-    
-    with open(output_file, 'w') as f:
-        json.dump(fixtures, f, indent=2)
     
-    print(f"Converted {len(django_users)} users and {len(django_roles)} roles to {output_file}")
+    print(f"Converted {user_count} users and {role_count} roles to {', '.join(writer.files)}")
 
-def convert_properties(supabase_data, output_file):
+def convert_properties(records, writer):
     """Convert Supabase properties to Django properties."""
-    django_properties = []
-    django_images = []
-    django_features = []
+    property_count = 0
+    image_count = 0
+    relation_count = 0
     
-    features_set = set()
+    # Feature pks follow first appearance in the export, so reruns produce identical fixtures
+    feature_pks = {}
     
-    for i, prop in enumerate(supabase_data):
-        django_property = {
+    for i, prop in enumerate(records):
+        writer.write({
             "model": "properties.property",
             "pk": i + 1,
             "fields": {
@@ -82,13 +200,15 @@ def convert_properties(supabase_data, output_file):
                 "created_at": prop.get("created_at", datetime.now().isoformat()),
                 "updated_at": prop.get("updated_at", datetime.now().isoformat())
             }
-        }
+        })
+        property_count += 1
         
         # Add images for the property
         for j, image_url in enumerate(prop.get("images", [])):
-            django_images.append({
+            image_count += 1
+            writer.write({
                 "model": "properties.propertyimage",
-                "pk": len(django_images) + 1,
+                "pk": image_count,
                 "fields": {
                     "property": i + 1,
                     "image": image_url,
@@ -97,56 +217,80 @@ def convert_properties(supabase_data, output_file):
                 }
             })
         
-        # Add features for the property
-        for feature in prop.get("features", []):
-            features_set.add(feature)
-            django_features.append({
+        # Add features for the property, emitting each feature the first time it is seen
+        for feature in dict.fromkeys(prop.get("features", [])):
+            if feature not in feature_pks:
+                feature_pks[feature] = len(feature_pks) + 1
+                writer.write({
+                    "model": "properties.propertyfeature",
+                    "pk": feature_pks[feature],
+                    "fields": {
+                        "name": feature
+                    }
+                })
+            
+            relation_count += 1
+            writer.write({
                 "model": "properties.propertyfeaturerelation",
-                "pk": len(django_features) + 1,
+                "pk": relation_count,
                 "fields": {
                     "property": i + 1,
-                    "feature": feature
+                    "feature": feature_pks[feature]
                 }
             })
-        
-        django_properties.append(django_property)
     
-    # Create feature objects
-    feature_objects = []
-    for i, feature in enumerate(features_set):
-        feature_objects.append({
-            "model": "properties.propertyfeature",
-            "pk": i + 1,
+    print(f"Converted {property_count} properties, {image_count} images and {len(feature_pks)} features "
+          f"to {', '.join(writer.files)}")
+
+def convert_areas(records, writer):
+    """
+    Convert Supabase areas to Django areas.
+    
+    properties_count and average_price are left at their defaults; run
+    `python manage.py recompute_area_stats` once the properties are loaded.
+    """
+    area_count = 0
+    
+    for i, area in enumerate(records):
+        writer.write({
+            "model": "areas.area",
+            "pk": area.get("id", i + 1),
             "fields": {
-                "name": feature
+                "name": area.get("name", f"Area {i+1}"),
+                "description": area.get("description", ""),
+                "image": area.get("image", area.get("image_url", "")),
+                "featured": area.get("featured", area.get("is_featured", False)),
+                "latitude": area.get("latitude", None),
+                "longitude": area.get("longitude", None),
+                "created_at": area.get("created_at", datetime.now().isoformat()),
+                "updated_at": area.get("updated_at", datetime.now().isoformat())
             }
         })
+        area_count += 1
     
-    # Combine all objects
-    fixtures = django_properties + django_images + feature_objects + django_features
-    
-    with open(output_file, 'w') as f:
-        json.dump(fixtures, f, indent=2)
-    
-    print(f"Converted {len(django_properties)} properties to {output_file}")
+    print(f"Converted {area_count} areas to {', '.join(writer.files)}")
+
+CONVERTERS = {
+    'users': convert_users,
+    'properties': convert_properties,
+    'areas': convert_areas,
+}
 
 def main():
     parser = argparse.ArgumentParser(description='Convert Supabase JSON exports to Django fixtures')
-    parser.add_argument('input_file', help='Path to Supabase JSON export file')
+    parser.add_argument('input_file', help='Path to Supabase JSON export file (JSON array or NDJSON)')
     parser.add_argument('output_file', help='Path to Django fixture output file')
-    parser.add_argument('model_type', choices=['users', 'properties', 'areas'], 
+    parser.add_argument('model_type', choices=sorted(CONVERTERS),
                         help='Type of model to convert')
+    parser.add_argument('--shard-size', type=int, default=None,
+                        help='Split the output into files of at most this many objects')
+    parser.add_argument('--indent', type=int, default=None,
+                        help='Pretty-print each object (larger output)')
     
     args = parser.parse_args()
     
-    with open(args.input_file, 'r') as f:
-        supabase_data = json.load(f)
-    
-    if args.model_type == 'users':
-        convert_users(supabase_data, args.output_file)
-    elif args.model_type == 'properties':
-        convert_properties(supabase_data, args.output_file)
-    # Add more converters as needed
-    
+    with FixtureWriter(args.output_file, shard_size=args.shard_size, indent=args.indent) as writer:
+        CONVERTERS[args.model_type](iter_records(args.input_file), writer)
+
 if __name__ == "__main__":
     main()